@@ -0,0 +1,105 @@
+import collections
+
+import numpy as np
+
+from bitboard import BitboardState
+from search import SimpleEvaluation, Evaluation_v1, Evaluation_v2
+
+# a batch of boards is an int8 array of shape (N, height, width), same layout as State.board
+WHITE_PIECE, BLACK_PIECE, EMPTY_SQUARE = 1, -1, 0
+
+# (dx, dy) of the white jumps, black jumps the same with -dy
+QUIET_JUMPS = ((-1, 2), (1, 2), (-2, 1), (2, 1))
+CAPTURES = ((-1, 1), (1, 1))
+
+# one array of N values per feature
+BatchFeatures = collections.namedtuple("BatchFeatures", ["white_count", "black_count",
+                                                         "white_advance", "black_advance", "attacks"])
+
+
+# boards: list of lists of lists like State.board
+def encode_boards(boards):
+    cells = np.array(boards)
+    return (cells == "W").astype(np.int8) - (cells == "B").astype(np.int8)
+
+# states: a list of State or BitboardState of the same board size
+# bitboards are unpacked straight from their bytes instead of going through BitboardState.board
+def encode_states(states):
+    if not isinstance(states[0], BitboardState):
+        return encode_boards([state.board for state in states])
+    width, height = states[0].width, states[0].height
+    n_bytes = (width*height + 7) // 8
+    def unpack(bitboards):
+        data = np.frombuffer(b"".join(bits.to_bytes(n_bytes, "little") for bits in bitboards), dtype=np.uint8)
+        bits = np.unpackbits(data.reshape(len(states), n_bytes), axis=1, bitorder="little")
+        return bits[:, :width*height].reshape(len(states), height, width).astype(np.int8)
+    return unpack([state.white for state in states]) - unpack([state.black for state in states])
+
+# boolean array (N, height - |dy|, width - |dx|) that is True where a has a piece on (x, y) and b on (x + dx, y + dy)
+def pairs(a, b, dx, dy):
+    height, width = a.shape[1], a.shape[2]
+    a_rows, b_rows = (slice(0, height - dy), slice(dy, height)) if dy >= 0 else (slice(-dy, height), slice(0, height + dy))
+    a_cols, b_cols = (slice(0, width - dx), slice(dx, width)) if dx >= 0 else (slice(-dx, width), slice(0, width + dx))
+    return a[:, a_rows, a_cols] & b[:, b_rows, b_cols]
+
+def batch_features(boards):
+    white, black = boards == WHITE_PIECE, boards == BLACK_PIECE
+    height = boards.shape[1]
+    rows = np.arange(height)
+    # most advanced piece of each side, 0 if the side has no pieces (like State.compute_features)
+    white_advance = np.where(white.any(axis=2), rows, 0).max(axis=1)
+    black_advance = np.where(black.any(axis=2), height - 1 - rows, 0).max(axis=1)
+    # every white piece that can capture a black piece can be captured by it, so both sides have the same number
+    attacks = sum(pairs(white, black, dx, dy).sum(axis=(1, 2)) for dx, dy in CAPTURES)
+    return BatchFeatures(white.sum(axis=(1, 2)), black.sum(axis=(1, 2)), white_advance, black_advance, attacks)
+
+# (game_over, winner) for every board like Environment.is_terminal, winner is an array of "W", "B", 0 or None
+# white_turn: one bool for all boards or an array of N bools
+def batch_terminal(boards, white_turn):
+    white, black = boards == WHITE_PIECE, boards == BLACK_PIECE
+    empty = boards == EMPTY_SQUARE
+    white_turn = np.broadcast_to(np.asarray(white_turn, dtype=bool), (boards.shape[0],))
+    white_can_move = np.zeros(boards.shape[0], dtype=bool)
+    black_can_move = np.zeros(boards.shape[0], dtype=bool)
+    for dx, dy in QUIET_JUMPS:
+        white_can_move |= pairs(white, empty, dx, dy).any(axis=(1, 2))
+        black_can_move |= pairs(black, empty, dx, -dy).any(axis=(1, 2))
+    for dx, dy in CAPTURES:
+        white_can_move |= pairs(white, black, dx, dy).any(axis=(1, 2))
+        black_can_move |= pairs(black, white, dx, -dy).any(axis=(1, 2))
+    white_won = white[:, -1].any(axis=1)
+    black_won = black[:, 0].any(axis=1) & ~white_won
+    draw = ~(white_won | black_won) & ~np.where(white_turn, white_can_move, black_can_move)
+    winner = np.full(boards.shape[0], None, dtype=object)
+    winner[white_won] = "W"
+    winner[black_won] = "B"
+    winner[draw] = 0
+    return white_won | black_won | draw, winner
+
+
+# vectorised versions of the evaluations in search.py for boards that are not over, scores from player's point of view
+def simple_evaluation(features, player):
+    k = features.white_advance - features.black_advance
+    return k if player == "white" else -k
+
+def evaluation_v1(features, player):
+    k = features.white_advance - features.black_advance + features.white_count - features.black_count
+    return k if player == "white" else -k
+
+def evaluation_v2(features, player):
+    # Evaluation_v2 adds the attacks of the player to move, which are the same for both sides
+    return features.attacks + evaluation_v1(features, player)
+
+BATCH_EVALUATIONS = {SimpleEvaluation: simple_evaluation, Evaluation_v1: evaluation_v1, Evaluation_v2: evaluation_v2}
+
+# scores every board the same way evaluation.eval(state, player, winner) does with the winner from is_terminal,
+# so finished games get 100 (won), -100 (lost) or 0 (draw)
+# evaluation: an instance or class of one of the evaluations in BATCH_EVALUATIONS
+def batch_eval(evaluation, boards, white_turn, player):
+    evaluation_class = evaluation if isinstance(evaluation, type) else type(evaluation)
+    scores = BATCH_EVALUATIONS[evaluation_class](batch_features(boards), player)
+    game_over, winner = batch_terminal(boards, white_turn)
+    won, lost = ("W", "B") if player == "white" else ("B", "W")
+    scores = np.where(winner == won, 100, scores)
+    scores = np.where(winner == lost, -100, scores)
+    return np.where(winner == 0, 0, scores)
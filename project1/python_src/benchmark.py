@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+"""
+Benchmarks for the Knightthrough search, every search is run to a fixed depth without a time limit.
+Usage: benchmark.py search [--sizes 5x5 6x6 8x8] [--depth 5] [--positions 4]
+       benchmark.py parallel [--sizes 8x8 10x10] [--clock 5] [--processes 8] [--positions 4]
+       benchmark.py eval-cost [--sizes 8x8 10x10] [--positions 10000]
+       benchmark.py eval [--sizes 8x8 10x10] [--positions 10000]   (needs numpy)
+Example: benchmark.py search --sizes 8x8 --depth 5
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import time
+
+from environment import Environment
+from bitboard import BitboardEnvironment
+from search import *
+from parallel_search import ParallelSearch
+
+
+# move lists that lead from the start position to some positions in the opening/middle game,
+# the start position is always the first one, the others come from seeded random games
+def benchmark_positions(width, height, n_positions, seed=0):
+    rng = random.Random(seed)
+    positions = [[]]
+    while len(positions) < n_positions:
+        env = Environment(width, height)
+        moves = []
+        for i in range(rng.randint(4, 2*height)):
+            game_over, winner, legal_moves = env.get_status(env.current_state)
+            if game_over:
+                break
+            move = rng.choice(legal_moves)
+            env.move(env.current_state, move)
+            moves.append(move)
+        if not env.is_terminal(env.current_state)[0]:
+            positions.append(moves)
+    return positions
+
+def setup(environment_class, width, height, moves):
+    env = environment_class(width, height)
+    for move in moves:
+        env.move(env.current_state, move)
+    return env
+
+def player_to_move(env):
+    return "white" if env.current_state.white_turn else "black"
+
+# runs search.do_search to the given depth and returns (expanded nodes, visited nodes, seconds),
+# visited nodes also counts leaves and quiescence nodes and is None for the searches that don't count them
+# the prints of the search are thrown away
+def run_search(search, env, depth):
+    search.init_evaluation(env, float('inf'))
+    t_start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        search.do_search(env, player_to_move(env), depth)
+    return search.get_nb_state_expansions(), getattr(search, "n_nodes", None), time.time() - t_start
+
+def print_table(title, rows):
+    print(title)
+    print(f"{'':28} {'expanded':>10} {'visited':>10} {'seconds':>9} {'visited/s':>10}")
+    for name, expanded, visited, seconds in rows:
+        if visited is None:
+            print(f"{name:28} {expanded:10} {'-':>10} {seconds:9.2f} {'-':>10}")
+        else:
+            print(f"{name:28} {expanded:10} {visited:10} {seconds:9.2f} {visited/max(seconds, 1e-9):10.0f}")
+    print()
+
+# node counts of plain alpha-beta and the iterative deepening modes at the same fixed depth
+def search_modes(sizes, depth, n_positions, environment_class=Environment):
+    modes = [
+        ("alpha-beta", lambda: AlphaBeta(SimpleEvaluation())),
+        ("iterative deepening", lambda: AlphaBeta_iterative_deepening_new(SimpleEvaluation())),
+        ("pvs", lambda: AlphaBeta_iterative_deepening_new(SimpleEvaluation(), pvs=True)),
+        ("pvs + aspiration", lambda: AlphaBeta_iterative_deepening_new(SimpleEvaluation(), pvs=True, aspiration=2)),
+        ("pvs + quiescence", lambda: AlphaBeta_iterative_deepening_new(SimpleEvaluation(), pvs=True, quiescence=True)),
+        ("pvs + null move", lambda: AlphaBeta_iterative_deepening_new(SimpleEvaluation(), pvs=True, null_move=2)),
+        ("pvs + lmr", lambda: AlphaBeta_iterative_deepening_new(SimpleEvaluation(), pvs=True, lmr=True)),
+        ("pvs + null move + lmr",
+         lambda: AlphaBeta_iterative_deepening_new(SimpleEvaluation(), pvs=True, null_move=2, lmr=True)),
+    ]
+    for width, height in sizes:
+        positions = benchmark_positions(width, height, n_positions)
+        rows = []
+        for name, make_search in modes:
+            expanded, visited, seconds = 0, 0, 0
+            for moves in positions:
+                e, v, t = run_search(make_search(), setup(environment_class, width, height, moves), depth)
+                expanded += e
+                visited = visited + v if v is not None else None
+                seconds += t
+            rows.append((name, expanded, visited, seconds))
+        print_table(f"{width}x{height}, depth {depth}, {len(positions)} positions", rows)
+
+# depth reached within the play clock by the serial search and the parallel root-splitting search
+def parallel_depth(sizes, play_clock, n_processes, n_positions, environment_class=Environment):
+    parallel = ParallelSearch(SimpleEvaluation(), n_processes)
+    for width, height in sizes:
+        positions = benchmark_positions(width, height, n_positions)
+        rows = []
+        for name, search in (("serial", AlphaBeta_iterative_deepening_new(SimpleEvaluation())),
+                             (f"parallel ({n_processes} processes)", parallel)):
+            depths = []
+            for moves in positions:
+                env = setup(environment_class, width, height, moves)
+                search.init_evaluation(env, play_clock)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    search.do_search(env, player_to_move(env), 100)
+                depths.append(search.depth_reached)
+            rows.append((name, depths))
+        print(f"{width}x{height}, play clock {play_clock} s, {len(positions)} positions")
+        for name, depths in rows:
+            print(f"{name:28} depth reached {depths}, average {sum(depths)/len(depths):.2f}")
+        print()
+    parallel.close()
+
+# states from random games, for timing evaluations
+def random_states(environment_class, width, height, n_states, seed=0):
+    rng = random.Random(seed)
+    states = []
+    while len(states) < n_states:
+        env = environment_class(width, height)
+        while len(states) < n_states:
+            game_over, winner, legal_moves = env.get_status(env.current_state)
+            if game_over:
+                break
+            env.move(env.current_state, rng.choice(legal_moves))
+            states.append(env.current_state.clone())
+    return states
+
+# time of one Evaluations.eval call of every evaluation on states from random games, and how many times
+# as long as SimpleEvaluation it takes (the game over check is done before the timing)
+def eval_cost(sizes, n_states, environment_class=Environment):
+    for width, height in sizes:
+        states = random_states(environment_class, width, height, n_states)
+        env = environment_class(width, height)
+        states = [state for state in states if not env.is_terminal(state)[0]]
+        print(f"{width}x{height}, {len(states)} states")
+        simple_seconds = None
+        for evaluation in (SimpleEvaluation(), Evaluation_v1(), Evaluation_v2(), TunedEvaluation.load()):
+            evaluation.init(env)
+            seconds = float('inf')
+            # best of 5 runs, the first one also warms up the caches
+            for i in range(5):
+                t_start = time.perf_counter()
+                for state in states:
+                    evaluation.eval(state, "white")
+                seconds = min(seconds, time.perf_counter() - t_start)
+            if simple_seconds is None:
+                simple_seconds = seconds
+            print(f"{type(evaluation).__name__:28} {seconds/len(states)*1e6:9.3f} us/eval "
+                  f"{seconds/simple_seconds:6.2f} x SimpleEvaluation")
+        print()
+
+# evaluations per second of Evaluations.eval one state at a time and of batch_eval.batch_eval on all states at once
+def eval_speed(sizes, n_states, environment_class=Environment):
+    from batch_eval import encode_states, batch_eval
+    for width, height in sizes:
+        states = random_states(environment_class, width, height, n_states)
+        env = environment_class(width, height)
+        print(f"{width}x{height}, {n_states} states")
+        for evaluation in (SimpleEvaluation(), Evaluation_v2()):
+            evaluation.init(env)
+            name = type(evaluation).__name__
+            t_start = time.time()
+            for state in states:
+                game_over, winner = env.is_terminal(state)
+                evaluation.eval(state, "white", winner)
+            seconds = time.time() - t_start
+            print(f"{name + ' one by one':28} {seconds:9.3f} s {n_states/seconds:12.0f} states/s")
+            t_start = time.time()
+            boards = encode_states(states)
+            t_encoded = time.time()
+            batch_eval(evaluation, boards, [state.white_turn for state in states], "white")
+            t_end = time.time()
+            print(f"{name + ' batch':28} {t_end - t_encoded:9.3f} s {n_states/(t_end - t_encoded):12.0f} states/s"
+                  f" (+{t_encoded - t_start:.3f} s encoding the states)")
+        print()
+
+def board_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the Knightthrough search")
+    parser.add_argument("--bitboard", action="store_true", help="use BitboardEnvironment instead of Environment")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    search_parser = commands.add_parser("search", help="node counts of the search modes at a fixed depth")
+    search_parser.add_argument("--sizes", type=board_size, nargs="+", default=[(5, 5), (6, 6), (8, 8)])
+    search_parser.add_argument("--depth", type=int, default=5)
+    search_parser.add_argument("--positions", type=int, default=4)
+
+    parallel_parser = commands.add_parser("parallel", help="depth reached per play clock, serial and parallel")
+    parallel_parser.add_argument("--sizes", type=board_size, nargs="+", default=[(8, 8), (10, 10)])
+    parallel_parser.add_argument("--clock", type=float, default=5)
+    parallel_parser.add_argument("--processes", type=int, default=None)
+    parallel_parser.add_argument("--positions", type=int, default=4)
+
+    cost_parser = commands.add_parser("eval-cost", help="time of one eval() call of every evaluation")
+    cost_parser.add_argument("--sizes", type=board_size, nargs="+", default=[(8, 8), (10, 10)])
+    cost_parser.add_argument("--positions", type=int, default=10000)
+
+    eval_parser = commands.add_parser("eval", help="evaluations per second, one by one and in a numpy batch")
+    eval_parser.add_argument("--sizes", type=board_size, nargs="+", default=[(8, 8), (10, 10)])
+    eval_parser.add_argument("--positions", type=int, default=10000)
+
+    args = parser.parse_args()
+    environment_class = BitboardEnvironment if args.bitboard else Environment
+    if args.command == "search":
+        search_modes(args.sizes, args.depth, args.positions, environment_class)
+    elif args.command == "parallel":
+        parallel_depth(args.sizes, args.clock, args.processes or os.cpu_count(), args.positions, environment_class)
+    elif args.command == "eval-cost":
+        eval_cost(args.sizes, args.positions, environment_class)
+    elif args.command == "eval":
+        eval_speed(args.sizes, args.positions, environment_class)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+from zobrist import get_zobrist_keys, zobrist_hash
+
+WHITE, BLACK, EMPTY = "W", "B", " "
+
+
+# same board as State but each side is stored as one integer,
+# bit number y*width + x is set if the side has a piece on (x, y)
+class BitboardState:
+    __slots__ = ("white", "black", "white_turn", "width", "height", "hash")
+
+    def __init__(self, width, height) -> None:
+        row = (1 << width) - 1
+        self.white = row | (row << width)
+        self.black = (row | (row << width)) << (height - 2) * width
+
+        self.white_turn = True
+        self.width = width
+        self.height = height
+        self.hash = zobrist_hash(self.board, self.white_turn, width, height)
+
+    # sets up any position, board is a list of lists like State.board
+    def set_board(self, board, white_turn):
+        self.white, self.black = 0, 0
+        for y in range(self.height):
+            for x in range(self.width):
+                if board[y][x] == WHITE:
+                    self.white |= 1 << (y*self.width + x)
+                elif board[y][x] == BLACK:
+                    self.black |= 1 << (y*self.width + x)
+        self.white_turn = white_turn
+        self.hash = zobrist_hash(board, white_turn, self.width, self.height)
+
+    # copy of the state in O(1), it is only a few ints
+    def clone(self):
+        state = BitboardState.__new__(BitboardState)
+        state.white, state.black, state.white_turn = self.white, self.black, self.white_turn
+        state.width, state.height, state.hash = self.width, self.height, self.hash
+        return state
+
+    # the evaluation features State keeps up to date in move/undo_move,
+    # here they are computed straight from the bitboards
+    @property
+    def white_count(self):
+        return bin(self.white).count("1")
+
+    @property
+    def black_count(self):
+        return bin(self.black).count("1")
+
+    @property
+    def white_advance(self):
+        if not self.white:
+            return 0
+        return (self.white.bit_length() - 1) // self.width
+
+    @property
+    def black_advance(self):
+        if not self.black:
+            return 0
+        return self.height - 1 - ((self.black & -self.black).bit_length() - 1) // self.width
+
+    @property
+    def white_rows(self):
+        row = (1 << self.width) - 1
+        return [bin((self.white >> y*self.width) & row).count("1") for y in range(self.height)]
+
+    @property
+    def black_rows(self):
+        row = (1 << self.width) - 1
+        return [bin((self.black >> y*self.width) & row).count("1") for y in range(self.height)]
+
+    # list of lists view of the board, same layout as State.board
+    # (slow, only meant for printing and the evaluations that still scan the board)
+    @property
+    def board(self):
+        board = []
+        bit = 1
+        for y in range(self.height):
+            row = []
+            for x in range(self.width):
+                if self.white & bit:
+                    row.append(WHITE)
+                elif self.black & bit:
+                    row.append(BLACK)
+                else:
+                    row.append(EMPTY)
+                bit <<= 1
+            board.append(row)
+        return board
+
+    def __str__(self) -> str:
+        dash_count = self.width*4 - 3
+        line = "\n" + "-"*dash_count + "\n"
+        return line.join([" | ".join(cell for cell in row) for row in self.board[::-1]])
+
+
+# Environment with the same interface as environment.Environment,
+# but move generation is done with shifts and masks on the bitboards
+class BitboardEnvironment:
+    def __init__(self, width, height) -> None:
+        self.width = width
+        self.height = height
+        self.current_state = BitboardState(width, height)
+
+        # masks of squares a piece can jump from without leaving the board sideways
+        self.full = (1 << width*height) - 1
+        not_left, not_left2, not_right, not_right2 = 0, 0, 0, 0
+        for y in range(height):
+            for x in range(width):
+                bit = 1 << (y*width + x)
+                if x > 0:
+                    not_left |= bit
+                if x > 1:
+                    not_left2 |= bit
+                if x < width - 1:
+                    not_right |= bit
+                if x < width - 2:
+                    not_right2 |= bit
+        self.top_row = ((1 << width) - 1) << (height - 1)*width
+        self.bottom_row = (1 << width) - 1
+
+        # (shift, source mask) for every jump, white shifts up (<<) and black shifts down (>>)
+        w = width
+        self.white_quiet = ((2*w - 1, not_left), (2*w + 1, not_right),
+                            (w - 2, not_left2), (w + 2, not_right2))
+        self.white_captures = ((w - 1, not_left), (w + 1, not_right))
+        self.black_quiet = ((2*w + 1, not_left), (2*w - 1, not_right),
+                            (w + 2, not_left2), (w - 2, not_right2))
+        self.black_captures = ((w + 1, not_left), (w - 1, not_right))
+
+        # square number -> (x, y)
+        self.coords = [(sq % width, sq // width) for sq in range(width*height)]
+        self.white_keys, self.black_keys, self.black_turn_key = get_zobrist_keys(width, height)
+
+    def get_legal_moves(self, state):
+        moves = []
+        coords = self.coords
+        empty = ~(state.white | state.black) & self.full
+        if state.white_turn:
+            own = state.white
+            for shift, mask in self.white_quiet:
+                targets = ((own & mask) << shift) & empty
+                while targets:
+                    bit = targets & -targets
+                    to = bit.bit_length() - 1
+                    moves.append(coords[to - shift] + coords[to])
+                    targets ^= bit
+            for shift, mask in self.white_captures:
+                targets = ((own & mask) << shift) & state.black
+                while targets:
+                    bit = targets & -targets
+                    to = bit.bit_length() - 1
+                    moves.append(coords[to - shift] + coords[to])
+                    targets ^= bit
+        else:
+            own = state.black
+            for shift, mask in self.black_quiet:
+                targets = ((own & mask) >> shift) & empty
+                while targets:
+                    bit = targets & -targets
+                    to = bit.bit_length() - 1
+                    moves.append(coords[to + shift] + coords[to])
+                    targets ^= bit
+            for shift, mask in self.black_captures:
+                targets = ((own & mask) >> shift) & state.white
+                while targets:
+                    bit = targets & -targets
+                    to = bit.bit_length() - 1
+                    moves.append(coords[to + shift] + coords[to])
+                    targets ^= bit
+        return moves
+
+    # only the diagonal captures of get_legal_moves (used by the quiescence search)
+    def get_capture_moves(self, state):
+        moves = []
+        coords = self.coords
+        if state.white_turn:
+            for shift, mask in self.white_captures:
+                targets = ((state.white & mask) << shift) & state.black
+                while targets:
+                    bit = targets & -targets
+                    to = bit.bit_length() - 1
+                    moves.append(coords[to - shift] + coords[to])
+                    targets ^= bit
+        else:
+            for shift, mask in self.black_captures:
+                targets = ((state.black & mask) >> shift) & state.white
+                while targets:
+                    bit = targets & -targets
+                    to = bit.bit_length() - 1
+                    moves.append(coords[to + shift] + coords[to])
+                    targets ^= bit
+        return moves
+
+    # True if the player to move has at least one legal move, stops at the first one found
+    def has_legal_moves(self, state):
+        empty = ~(state.white | state.black) & self.full
+        if state.white_turn:
+            own = state.white
+            for shift, mask in self.white_quiet:
+                if ((own & mask) << shift) & empty:
+                    return True
+            for shift, mask in self.white_captures:
+                if ((own & mask) << shift) & state.black:
+                    return True
+        else:
+            own = state.black
+            for shift, mask in self.black_quiet:
+                if ((own & mask) >> shift) & empty:
+                    return True
+            for shift, mask in self.black_captures:
+                if ((own & mask) >> shift) & state.white:
+                    return True
+        return False
+
+    # makes the move and returns an undo record, for bitboards that is simply
+    # the two boards and the hash from before the move
+    def move(self, state, move):
+        x1, y1, x2, y2 = move
+        undo = (state.white, state.black, state.hash)
+        start, end = y1*self.width + x1, y2*self.width + x2
+        from_to = (1 << start) | (1 << end)
+        if state.white_turn:
+            h = state.hash ^ self.white_keys[start] ^ self.white_keys[end] ^ self.black_turn_key
+            if state.black & from_to:
+                h ^= self.black_keys[end]
+            state.white ^= from_to
+            state.black &= ~from_to
+        else:
+            h = state.hash ^ self.black_keys[start] ^ self.black_keys[end] ^ self.black_turn_key
+            if state.white & from_to:
+                h ^= self.white_keys[end]
+            state.black ^= from_to
+            state.white &= ~from_to
+        state.hash = h
+        state.white_turn = not state.white_turn
+        return undo
+
+    def was_diagonal_move(self, move):
+        x1, y1, x2, y2 = move
+        return (x2 - x1 == 1 or x1 - x2 == 1) and (y2 - y1 == 1 or y1 - y2 == 1)
+
+    # takes back the move, undo is the record returned by move()
+    def undo_move(self, state, undo):
+        state.white, state.black, state.hash = undo
+        state.white_turn = not state.white_turn
+
+    # same as Environment.null_move, only the player to move and the hash change
+    def null_move(self, state):
+        undo = state.hash
+        state.hash ^= self.black_turn_key
+        state.white_turn = not state.white_turn
+        return undo
+
+    def undo_null_move(self, state, undo):
+        state.hash = undo
+        state.white_turn = not state.white_turn
+
+    def is_terminal(self, state):
+        if state.white & self.top_row:
+            return True, WHITE
+        if state.black & self.bottom_row:
+            return True, BLACK
+        if not self.has_legal_moves(state):
+            return True, 0
+        return False, None
+
+    # is_terminal and get_legal_moves in one pass, returns (game_over, winner, moves)
+    # moves is empty when the game is over
+    def get_status(self, state):
+        if state.white & self.top_row:
+            return True, WHITE, []
+        if state.black & self.bottom_row:
+            return True, BLACK, []
+        moves = self.get_legal_moves(state)
+        if not moves:
+            return True, 0, moves
+        return False, None, moves
+
+    # number of diagonal captures available to the player to move and to the opponent
+    def get_n_attacking_moves(self, state):
+        white_attacks = 0
+        for shift, mask in self.white_captures:
+            white_attacks += bin(((state.white & mask) << shift) & state.black).count("1")
+        black_attacks = 0
+        for shift, mask in self.black_captures:
+            black_attacks += bin(((state.black & mask) >> shift) & state.white).count("1")
+        if state.white_turn:
+            return white_attacks, black_attacks
+        return black_attacks, white_attacks
+
+
+if __name__ == "__main__":
+    env = BitboardEnvironment(3, 5)
+    print(env.current_state)
+    print(env.get_legal_moves(env.current_state))
+    undo = env.move(env.current_state, (0, 0, 1, 2))
+    print(env.current_state)
+    print("is terminal: ", env.is_terminal(env.current_state))
+    env.undo_move(env.current_state, undo)
+    print(env.current_state)
@@ -3,64 +3,174 @@ import re
 from enum import IntEnum
 
 from state import State
+from zobrist import get_zobrist_keys
 
 import time
 
 WHITE, BLACK, EMPTY = "W", "B", " "
 
 
+# knight move tables, built once per board size and shared by every Environment of that size
+# move_tables[(width, height)] = (quiet, captures), where quiet[white_turn][y][x] is a tuple
+# of the (x2, y2) squares the piece on (x, y) can jump to and captures[white_turn][y][x]
+# the squares it can capture on, both already clipped to the board
+move_tables = {}
+
+def build_move_tables(width, height):
+    if (width, height) in move_tables:
+        return move_tables[(width, height)]
+    quiet = [[[() for x in range(width)] for y in range(height)] for color in range(2)]
+    captures = [[[() for x in range(width)] for y in range(height)] for color in range(2)]
+    for white_turn in (False, True):
+        one_step = 1 if white_turn else -1
+        for y in range(height):
+            for x in range(width):
+                # two steps forward and one step left/right, then one step forward and two steps left/right
+                jumps = [(x - 1, y + 2*one_step), (x + 1, y + 2*one_step),
+                         (x - 2, y + one_step), (x + 2, y + one_step)]
+                # kill opponent, only one step diagonal forward
+                kills = [(x - 1, y + one_step), (x + 1, y + one_step)]
+                quiet[white_turn][y][x] = tuple((x2, y2) for x2, y2 in jumps
+                                                if 0 <= x2 < width and 0 <= y2 < height)
+                captures[white_turn][y][x] = tuple((x2, y2) for x2, y2 in kills
+                                                   if 0 <= x2 < width and 0 <= y2 < height)
+    move_tables[(width, height)] = quiet, captures
+    return quiet, captures
+
+
 class Environment:
     def __init__(self, width, height) -> None:
         self.width = width
         self.height = height
         self.current_state = State(width, height)
+        self.quiet_moves, self.capture_moves = build_move_tables(width, height)
+        white_keys, black_keys, self.black_turn_key = get_zobrist_keys(width, height)
+        self.piece_keys = {WHITE: white_keys, BLACK: black_keys}
     
-    def can_move_n_steps_forward(self, state, y, max_height_black, max_height_white):
-        if state.white_turn:
-            return y <= max_height_white
-        else:
-            return y >= max_height_black
-        
-    def get_moves(self, state, move, y, x):
+    def get_legal_moves(self, state):
+        moves = []
+        board = state.board
+        friendly = WHITE if state.white_turn else BLACK
         opponent = BLACK if state.white_turn else WHITE
-        one_step = 1 if state.white_turn else -1
-        two_steps = 2 if state.white_turn else -2
-        
-        # two steps forward and one step left/right
-        if self.can_move_n_steps_forward(state, y, 2, self.height - 3):
-            if x > 0 and state.board[y + two_steps][x - 1] == EMPTY:
-                move.append((x, y, x - 1, y + two_steps))
-            if x < self.width - 1 and state.board[y + two_steps][x + 1] == EMPTY:
-                move.append((x, y, x + 1, y + two_steps))
-            
-        # one step forward and two step left/right
-        if self.can_move_n_steps_forward(state, y, 1, self.height - 2):
-            if x > 1 and state.board[y + one_step][x - 2] == EMPTY:
-                move.append((x, y, x - 2, y + one_step))
-            if x < self.width - 2 and state.board[y + one_step][x + 2] == EMPTY:
-                move.append((x, y, x + 2, y + one_step))	
-            # kill opponent, only one step diagonal forward
-            if x > 0 and state.board[y + one_step][x - 1] == opponent:
-                move.append((x, y, x - 1, y + one_step))
-            if x < self.width - 1 and state.board[y + one_step][x + 1] == opponent:
-                move.append((x, y, x + 1, y + one_step))
+        quiet_moves = self.quiet_moves[state.white_turn]
+        capture_moves = self.capture_moves[state.white_turn]
+        for y in range(self.height):
+            row = board[y]
+            for x in range(self.width):
+                if row[x] == friendly:
+                    for x2, y2 in quiet_moves[y][x]:
+                        if board[y2][x2] == EMPTY:
+                            moves.append((x, y, x2, y2))
+                    for x2, y2 in capture_moves[y][x]:
+                        if board[y2][x2] == opponent:
+                            moves.append((x, y, x2, y2))
+        return moves
 
-    
-        
-    def get_legal_moves(self, state):
+    # only the diagonal captures of get_legal_moves, in the same order (used by the quiescence search)
+    def get_capture_moves(self, state):
         moves = []
+        board = state.board
         friendly = WHITE if state.white_turn else BLACK
-        #t_start = time.time()
+        opponent = BLACK if state.white_turn else WHITE
+        capture_moves = self.capture_moves[state.white_turn]
         for y in range(self.height):
+            row = board[y]
             for x in range(self.width):
-                if state.board[y][x] == friendly:
-                    self.get_moves(state, moves, y, x)
+                if row[x] == friendly:
+                    for x2, y2 in capture_moves[y][x]:
+                        if board[y2][x2] == opponent:
+                            moves.append((x, y, x2, y2))
         return moves
 
+    # True if the player to move has at least one legal move, stops at the first one found
+    def has_legal_moves(self, state):
+        board = state.board
+        friendly = WHITE if state.white_turn else BLACK
+        opponent = BLACK if state.white_turn else WHITE
+        quiet_moves = self.quiet_moves[state.white_turn]
+        capture_moves = self.capture_moves[state.white_turn]
+        for y in range(self.height):
+            row = board[y]
+            for x in range(self.width):
+                if row[x] == friendly:
+                    for x2, y2 in quiet_moves[y][x]:
+                        if board[y2][x2] == EMPTY:
+                            return True
+                    for x2, y2 in capture_moves[y][x]:
+                        if board[y2][x2] == opponent:
+                            return True
+        return False
+
+    # makes the move and returns an undo record (x1, y1, x2, y2, captured piece, hash, white_advance, black_advance,
+    # attacks from before the move) that undo_move uses to put the state back exactly as it was
     def move(self, state, move):
         x1, y1, x2, y2 = move
-        state.board[y2][x2], state.board[y1][x1] = state.board[y1][x1], EMPTY
+        board = state.board
+        moved, captured = board[y1][x1], board[y2][x2]
+        undo = (x1, y1, x2, y2, captured, state.hash, state.white_advance, state.black_advance, state.attacks)
+
+        # a piece only forms capture pairs with opponent pieces diagonally in front of it, so only the pairs
+        # of the moved piece (before and after) and of the captured piece change
+        captures = self.capture_moves
+        opponent = BLACK if state.white_turn else WHITE
+        attacks = state.attacks
+        for x3, y3 in captures[state.white_turn][y1][x1]:
+            if board[y3][x3] == opponent:
+                attacks -= 1
+        if captured != EMPTY:
+            # the pair with the moved piece was already taken off above
+            for x3, y3 in captures[not state.white_turn][y2][x2]:
+                if board[y3][x3] == moved and (x3 != x1 or y3 != y1):
+                    attacks -= 1
+        for x3, y3 in captures[state.white_turn][y2][x2]:
+            if board[y3][x3] == opponent:
+                attacks += 1
+        state.attacks = attacks
+
+        # xor the moving piece out of (x1, y1) and into (x2, y2), the captured piece out and flip the player to move
+        keys = self.piece_keys[moved]
+        h = state.hash ^ keys[y1*self.width + x1] ^ keys[y2*self.width + x2] ^ self.black_turn_key
+        if captured != EMPTY:
+            h ^= self.piece_keys[captured][y2*self.width + x2]
+        state.hash = h
+
+        if state.white_turn:
+            state.white_rows[y1] -= 1
+            state.white_rows[y2] += 1
+            if y2 > state.white_advance:
+                state.white_advance = y2
+            if captured != EMPTY:
+                state.black_count -= 1
+                state.black_rows[y2] -= 1
+                if not state.black_rows[y2] and self.height - 1 - y2 == state.black_advance:
+                    state.black_advance = self.get_black_advance(state)
+        else:
+            state.black_rows[y1] -= 1
+            state.black_rows[y2] += 1
+            if self.height - 1 - y2 > state.black_advance:
+                state.black_advance = self.height - 1 - y2
+            if captured != EMPTY:
+                state.white_count -= 1
+                state.white_rows[y2] -= 1
+                if not state.white_rows[y2] and y2 == state.white_advance:
+                    state.white_advance = self.get_white_advance(state)
+        board[y2][x2], board[y1][x1] = moved, EMPTY
         state.white_turn = not state.white_turn
+        return undo
+
+    # row of the most advanced white piece, only needed when the most advanced one is captured
+    def get_white_advance(self, state):
+        for y in range(self.height - 1, -1, -1):
+            if state.white_rows[y]:
+                return y
+        return 0
+
+    # rows the most advanced black piece has come from the top
+    def get_black_advance(self, state):
+        for y in range(self.height):
+            if state.black_rows[y]:
+                return self.height - 1 - y
+        return 0
 
     def was_diagonal_move(self, move):
         x1, y1, x2, y2 = move
@@ -74,53 +184,64 @@ class Environment:
             return True
         return False
         
-    def undo_move(self, state, move):
-        x1, y1, x2, y2 = move
-
-        if self.was_diagonal_move(move):
-            if state.white_turn:
-                state.board[y1][x1], state.board[y2][x2] = state.board[y2][x2], WHITE
-            else:
-                state.board[y1][x1], state.board[y2][x2] = state.board[y2][x2], BLACK
-        else: # not diagonal move
-            state.board[y1][x1], state.board[y2][x2] = state.board[y2][x2], state.board[y1][x1]
+    # takes back the move, undo is the record returned by move()
+    def undo_move(self, state, undo):
+        x1, y1, x2, y2, captured, state.hash, state.white_advance, state.black_advance, state.attacks = undo
+        board = state.board
+        board[y1][x1], board[y2][x2] = board[y2][x2], captured
         
         state.white_turn = not state.white_turn
+        if state.white_turn:
+            state.white_rows[y1] += 1
+            state.white_rows[y2] -= 1
+            if captured != EMPTY:
+                state.black_count += 1
+                state.black_rows[y2] += 1
+        else:
+            state.black_rows[y1] += 1
+            state.black_rows[y2] -= 1
+            if captured != EMPTY:
+                state.white_count += 1
+                state.white_rows[y2] += 1
+
+    # passes the turn to the other player without moving a piece (the null move of null-move pruning),
+    # returns an undo record for undo_null_move
+    def null_move(self, state):
+        undo = state.hash
+        state.hash ^= self.black_turn_key
+        state.white_turn = not state.white_turn
+        return undo
+
+    def undo_null_move(self, state, undo):
+        state.hash = undo
+        state.white_turn = not state.white_turn
 
     def is_terminal(self, state):
-        if WHITE in state.board[self.height-1]:
+        if state.white_rows[-1]:
             return True, WHITE
-        if BLACK in state.board[0]:
+        if state.black_rows[0]:
             return True, BLACK
-        if len(self.get_legal_moves(state)) == 0:
+        if not self.has_legal_moves(state):
             return True, 0
         return False, None
+
+    # is_terminal and get_legal_moves in one pass, returns (game_over, winner, moves)
+    # moves is empty when the game is over
+    def get_status(self, state):
+        if state.white_rows[-1]:
+            return True, WHITE, []
+        if state.black_rows[0]:
+            return True, BLACK, []
+        moves = self.get_legal_moves(state)
+        if not moves:
+            return True, 0, moves
+        return False, None, moves
     
     
-    def count_attacks(self, state, opponent, one_step, y, x):
-        n = 0
-        if self.can_move_n_steps_forward(state, y, 1, self.height - 2):
-            if x > 0 and state.board[y + one_step][x - 1] == opponent:
-                n += 1
-            if x < self.width - 1 and state.board[y + one_step][x + 1] == opponent:
-                n += 1
-        return n
-
+    # number of diagonal captures available to the player to move and to the opponent,
+    # kept up to date by move/undo_move (captures always work both ways, so the two numbers are the same)
     def get_n_attacking_moves(self, state):
-        friendly = WHITE if state.white_turn else BLACK
-        opponent = BLACK if state.white_turn else WHITE
-        one_step = 1 if state.white_turn else -1
-        n_friendly_attacks = 0
-        n_opponent_attacks = 0
-        for y in range(self.height):
-            for x in range(self.width):
-                if state.board[y][x] == friendly:
-                    n_friendly_attacks = self.count_attacks(state, opponent, one_step, y, x)
-                if state.board[y][x] == opponent:
-                    n_opponent_attacks = self.count_attacks(state, friendly, one_step, y, x)
-                    
-
-        return n_friendly_attacks, n_opponent_attacks
+        return state.attacks, state.attacks
 
     
 
@@ -130,11 +251,12 @@ if __name__ == "__main__":
         return True
     
     def bla(game, state):
-        foo(game.move(state, (0, 0, 0, 2)))
+        undo = game.move(state, (0, 0, 0, 2))
+        foo(undo)
         print(state)
         print(game.get_legal_moves(state))
         print("is terminal: ", game.is_terminal(state))
-        game.undo_move(state, (0, 0, 0, 2))
+        game.undo_move(state, undo)
         print(state)
         print(game.get_legal_moves(state))
         print("is terminal: ", game.is_terminal(state))
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+"""
+Game records from the kiosk match logs in project1/logs, and a benchmark that searches every position of them.
+Usage: game_records.py extract [--logs dir] [--records file]
+       game_records.py replay [--records file] [--sizes 5x5 6x6] [--depth 4 | --clock 1] [--bitboard]
+Example: game_records.py replay --depth 4
+extract reads every kiosk.knightthrough_* log and writes one JSON line per game to the records file,
+replay searches the position before every move of every game with the current engine
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import struct
+import time
+
+from environment import Environment
+from bitboard import BitboardEnvironment
+from search import *
+from benchmark import board_size, player_to_move
+
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "logs")
+RECORDS_FILE = os.path.join(LOG_DIR, "game_records.jsonl")
+
+RECEIVED = re.compile(r'\[Received at (\d+)\] (.*)')
+START = re.compile(r'\(\s*START\s+(\S+)\s+(\S+)\s*\(', re.IGNORECASE)
+PLAY_OR_STOP = re.compile(r'\(\s*(PLAY|STOP)\s+(\S+)\s', re.IGNORECASE)
+LAST_MOVE = re.compile(r'\(\s*move\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s*\)', re.IGNORECASE)
+CLOCKS = re.compile(r'\)\s*(\d+)\s+(\d+)\s*\)\s*$')
+WIDTH = re.compile(r'width\s+(\d+)\s*\)')
+HEIGHT = re.compile(r'height\s+(\d+)\s*\)')
+
+
+# a move is packed into 16 bits as from square * number of squares + to square, (square = y*width + x)
+# and the moves of a game are stored as the hex string of those 16 bit numbers
+def pack_moves(moves, width, height):
+    n_squares = width*height
+    return b"".join(struct.pack("<H", (y1*width + x1)*n_squares + y2*width + x2)
+                    for x1, y1, x2, y2 in moves).hex()
+
+def unpack_moves(packed, width, height):
+    n_squares = width*height
+    moves = []
+    for (number,) in struct.iter_unpack("<H", bytes.fromhex(packed)):
+        start, end = divmod(number, n_squares)
+        moves.append((start % width, start // width, end % width, end // width))
+    return moves
+
+
+# reads the GamePlayer log of one kiosk match and returns the game record as a dict:
+# match, width, height, play_clock, kiosk_role (the role of the kiosk player, our agent had the other one),
+# moves (packed), n_moves, finished (the match ended with STOP) and winner ("W", "B", 0 or None if not over)
+# the moves are checked with an Environment, a game is cut off at the first illegal move
+# returns None if the log has no START message for its match
+def parse_kiosk_log(path):
+    match_id = os.path.basename(os.path.dirname(path)).rsplit("-kiosk", 1)[0]
+    with open(path) as f:
+        messages = [m.group(2) for m in RECEIVED.finditer(f.read())]
+    record, moves, finished = None, [], False
+    for msg in messages:
+        start = START.match(msg)
+        if start:
+            if start.group(1) != match_id or record is not None:
+                continue
+            width, height, clocks = WIDTH.search(msg), HEIGHT.search(msg), CLOCKS.search(msg)
+            if not (width and height and clocks):
+                continue
+            record = {"match": match_id, "width": int(width.group(1)), "height": int(height.group(1)),
+                      "play_clock": int(clocks.group(2)), "kiosk_role": start.group(2).lower()}
+            continue
+        command = PLAY_OR_STOP.match(msg)
+        if record is None or not command or command.group(2) != match_id:
+            continue
+        last_move = LAST_MOVE.search(msg)
+        if last_move:
+            moves.append(tuple(int(last_move.group(i)) - 1 for i in range(1, 5)))
+        if command.group(1).upper() == "STOP":
+            finished = True
+            break
+    if record is None:
+        return None
+
+    env = Environment(record["width"], record["height"])
+    legal_moves, winner = [], None
+    for move in moves:
+        game_over, winner, moves_here = env.get_status(env.current_state)
+        if game_over or move not in moves_here:
+            break
+        env.move(env.current_state, move)
+        legal_moves.append(move)
+    game_over, winner, moves_here = env.get_status(env.current_state)
+    record.update(moves=pack_moves(legal_moves, record["width"], record["height"]), n_moves=len(legal_moves),
+                  finished=finished, winner=winner if game_over else None)
+    return record
+
+def extract_records(log_dir=LOG_DIR):
+    records = []
+    for path in sorted(glob.glob(os.path.join(log_dir, "kiosk.knightthrough_*", "GamePlayer"))):
+        record = parse_kiosk_log(path)
+        if record is not None and record["n_moves"] > 0:
+            records.append(record)
+    return records
+
+def write_records(records, path=RECORDS_FILE):
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+def read_records(path=RECORDS_FILE):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# searches the position before every move of every game, returns a list of
+# (width, height, nodes, seconds, depth reached, True if the engine chose the move that was played)
+# make_search: function that returns a new search algorithm, every game gets its own
+# depth: fixed depth without a time limit, or clock: seconds per position (iterative deepening as deep as it gets)
+def replay(records, make_search, depth=None, clock=None, environment_class=Environment):
+    results = []
+    for record in records:
+        width, height = record["width"], record["height"]
+        env = environment_class(width, height)
+        search = make_search()
+        search.init_evaluation(env, clock if clock is not None else float('inf'))
+        for move in unpack_moves(record["moves"], width, height):
+            nodes_start = getattr(search, "n_nodes", None)
+            if nodes_start is None:
+                nodes_start = search.get_nb_state_expansions()
+            t_start = time.time()
+            best_move = search.do_search(env, player_to_move(env), depth if depth is not None else 100)
+            seconds = time.time() - t_start
+            nodes = getattr(search, "n_nodes", None)
+            if nodes is None:
+                nodes = search.get_nb_state_expansions()
+            results.append((width, height, nodes - nodes_start, seconds,
+                            getattr(search, "depth_reached", depth), tuple(best_move) == move))
+            env.move(env.current_state, move)
+    return results
+
+def print_replay(results):
+    print(f"{'size':>6} {'positions':>10} {'nodes':>10} {'seconds':>9} {'nodes/s':>9} {'avg depth':>10} {'same move':>10}")
+    for width, height in sorted(set((r[0], r[1]) for r in results)):
+        rows = [r for r in results if (r[0], r[1]) == (width, height)]
+        nodes = sum(r[2] for r in rows)
+        seconds = sum(r[3] for r in rows)
+        depths = [r[4] for r in rows if r[4] is not None]
+        print(f"{f'{width}x{height}':>6} {len(rows):10} {nodes:10} {seconds:9.2f} {nodes/max(seconds, 1e-9):9.0f} "
+              f"{sum(depths)/max(len(depths), 1):10.2f} {sum(r[5] for r in rows)/len(rows):10.1%}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Game records from the kiosk match logs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    extract_parser = commands.add_parser("extract", help="turn the kiosk logs into game records")
+    extract_parser.add_argument("--logs", default=LOG_DIR)
+    extract_parser.add_argument("--records", default=RECORDS_FILE)
+
+    replay_parser = commands.add_parser("replay", help="search every position of the game records")
+    replay_parser.add_argument("--records", default=RECORDS_FILE)
+    replay_parser.add_argument("--sizes", type=board_size, nargs="+", default=None)
+    limit = replay_parser.add_mutually_exclusive_group()
+    limit.add_argument("--depth", type=int, default=None)
+    limit.add_argument("--clock", type=float, default=None)
+    replay_parser.add_argument("--bitboard", action="store_true", help="use BitboardEnvironment instead of Environment")
+
+    args = parser.parse_args()
+    if args.command == "extract":
+        records = extract_records(args.logs)
+        write_records(records, args.records)
+        print(f"wrote {len(records)} games ({sum(r['n_moves'] for r in records)} moves) to {args.records}")
+    elif args.command == "replay":
+        records = read_records(args.records)
+        if args.sizes:
+            records = [r for r in records if (r["width"], r["height"]) in args.sizes]
+        depth = args.depth if args.depth is not None or args.clock is not None else 4
+        results = replay(records, lambda: AlphaBeta_iterative_deepening_new(SimpleEvaluation()), depth, args.clock,
+                         BitboardEnvironment if args.bitboard else Environment)
+        print_replay(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,16 @@
 """
 Runs a game player server listening on a TCP port (default 4001) for messages from an
 environment.
-Usage: gameplayer.py [port]
-Example: gameplayer.py 4001
+Usage: gameplayer.py [port] [--log]
+Example: gameplayer.py 4001 --log
+--log prints every message that is received and sent
 """
 
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import re
 import sys
+import threading
+import time
 from agent import *
 from search import *
 from my_agent import *
@@ -20,21 +23,49 @@ from my_agent import *
 A GamePlayer listens on a given port for messages from an
 environment and calls appropriate functions (start, next_action,
 cleanup) in the associated agent.
+Every request is handled in its own thread, the calls to the agent are serialized with a lock.
 """
 
 
-class GamePlayer(HTTPServer):
+class GamePlayer(ThreadingHTTPServer):
+    daemon_threads = True
 
-    def __init__(self, agent, port=4001):
+    # log: print every message that is received and sent
+    def __init__(self, agent, port=4001, log=False):
         self.agent = agent
+        self.log = log
+        self.agent_lock = threading.Lock()
+        # seconds spent on a request outside of the agent (reading, parsing and answering), the last one and
+        # the largest one of the match, agents that have an overhead attribute get the largest one after every
+        # request so they can take it off the play clock
+        self.last_overhead = 0.0
+        self.max_overhead = 0.0
         super().__init__(('', port), GGPRequestHandler)
         return
 
+    def record_overhead(self, overhead):
+        self.last_overhead = overhead
+        self.max_overhead = max(self.max_overhead, overhead)
+        if hasattr(self.agent, "overhead"):
+            self.agent.overhead = self.max_overhead
+
 
 #########
 
 """HTTP Request handler for the GamePlayer"""
 
+# the regular expressions are compiled once, PLAY and STOP messages (the ones sent during the match)
+# only need the command and the last move, only START looks at the game description
+COMMAND = re.compile(r'\(\s*(\S+)\s', re.IGNORECASE)
+LAST_MOVE = re.compile(r'\(\s*move\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s*\)', re.IGNORECASE)
+# msg="(START <MATCH ID> <ROLE> <GAME DESCRIPTION> <STARTCLOCK> <PLAYCLOCK>)"
+START_HEAD = re.compile(r'\s*\(\s*start\s+(?P<matchid>\S+)\s+(?P<role>\S+)\s*\(', re.IGNORECASE)
+START_TAIL = re.compile(r'\)\s*(?P<start_clock>\d+)\s+(?P<play_clock>\d+)\s*\)\s*$')
+# starting with the literal lets the regex engine jump straight to it, the rules are in lower case,
+# if they are not they are searched again lower cased
+WIDTH = re.compile(r'width\s+(\d+)\s*\)')
+HEIGHT = re.compile(r'height\s+(\d+)\s*\)')
+
 
 class GGPRequestHandler(BaseHTTPRequestHandler):
 
@@ -45,7 +76,13 @@ class GGPRequestHandler(BaseHTTPRequestHandler):
         self.send_header('Content-type', 'text/acl')
         self.end_headers()
         self.wfile.write(message.encode())
-        print("sending: " + str(code) + " - " + message)
+        if self.server.log:
+            print("sending: " + str(code) + " - " + message)
+
+    # the default prints a line for every request
+    def log_message(self, format, *args):
+        if self.server.log:
+            super().log_message(format, *args)
 
     def do_GET(self):
         self.respond(400, "Only POST requests are supported!")
@@ -54,24 +91,36 @@ class GGPRequestHandler(BaseHTTPRequestHandler):
         self.respond(400, "Only POST requests are supported!")
 
     def do_POST(self):
+        t_received = time.perf_counter()
         # Reads post request body
         content_len = int(self.headers['Content-Length'])
-        msg = self.rfile.read(content_len).decode().lower()
-        print("----------------")
-        print("received: " + msg)
+        msg = self.rfile.read(content_len).decode()
+        if self.server.log:
+            print("----------------")
+            print("received: " + msg)
         try:
             cmd = self.get_command(msg)
-            if cmd == "start":
-                self.command_start(msg)
-                response_string = "ready"
-            elif cmd == "play":
-                response_string = self.command_play(msg)
-            elif cmd == "stop":
-                self.command_stop(msg)
-                response_string = "done"
-            else:
-                response_string = "done"
+            # waiting for the agent to finish another request (e.g. a PLAY still thinking when STOP arrives)
+            # is not overhead of this request, it is left out
+            t_lock = time.perf_counter()
+            with self.server.agent_lock:
+                t_agent_start = time.perf_counter()
+                if cmd == "play":
+                    response_string = self.command_play(msg)
+                elif cmd == "start":
+                    self.command_start(msg)
+                    response_string = "ready"
+                    # new match, the overhead of the last one does not count anymore
+                    self.server.max_overhead = 0.0
+                elif cmd == "stop" or cmd == "abort":
+                    # msg="(ABORT <MATCHID>)" has no last move, the agent cleans up the same way as after STOP
+                    self.command_stop(msg)
+                    response_string = "done"
+                else:
+                    response_string = "done"
+                t_agent_end = time.perf_counter()
             self.respond(200, response_string)
+            self.server.record_overhead(t_lock - t_received + time.perf_counter() - t_agent_end)
 
         except Exception as ex:
             self.respond(400, "error processing command:" + str(ex))
@@ -79,36 +128,30 @@ class GGPRequestHandler(BaseHTTPRequestHandler):
 
     @staticmethod
     def get_command(msg):
-        match = re.search(r'\(\s*(\S+)\s', msg)
+        match = COMMAND.match(msg.lstrip())
         if match:
-            cmd = match.group(1)
+            cmd = match.group(1).lower()
         else:
             raise Exception("unrecognized message format")
         return cmd
 
     def command_start(self, msg):
-        # msg="(START <MATCH ID> <ROLE> <GAME DESCRIPTION> <STARTCLOCK> <PLAYCLOCK>)"
-        match = re.fullmatch(r"""
-        \s* \( \s* start
-        \s+ (?P<matchid> \S+ )
-        \s+ (?P<role> \S+ ) 
-        \s* \( (?P<rules> .*) \)
-        \s* (?P<start_clock> \d+ )
-        \s+ (?P<play_clock> \d+ )
-        \s* \) \s* """, msg, flags=re.DOTALL | re.VERBOSE)
-        if match:
-            role = match.group('role')
-            rules = match.group('rules')
-            # start_clock = int(match.group('start_clock'))
-            play_clock = int(match.group('play_clock'))
-
-            match = re.search(r'\(\s*width\s+(\d+)\s*\)', rules)
+        head = START_HEAD.match(msg)
+        # the clocks are at the very end, no need to look through the game description for them
+        tail = START_TAIL.search(msg, max(len(msg) - 64, 0))
+        if head and tail:
+            role = head.group('role').lower()
+            rules = msg[head.end():tail.start()]
+            # start_clock = int(tail.group('start_clock'))
+            play_clock = int(tail.group('play_clock'))
+
+            match = WIDTH.search(rules) or WIDTH.search(rules.lower())
             if match:
                 width = int(match.group(1))
             else:
                 raise RuntimeError("width not found in start message")
 
-            match = re.search(r'\(\s*height\s+(\d+)\s*\)', rules)
+            match = HEIGHT.search(rules) or HEIGHT.search(rules.lower())
             if match:
                 height = int(match.group(1))
             else:
@@ -121,7 +164,7 @@ class GGPRequestHandler(BaseHTTPRequestHandler):
     def parse_move(msg):
         # msg="(PLAY <MATCHID> <LASTMOVES>)"
         last_move = None
-        match = re.search(r'\(\s*move\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s*\)', msg)
+        match = LAST_MOVE.search(msg)
         if match:
             last_move = tuple([int(match.group(i)) for i in range(1, 5)])
         return last_move
@@ -135,6 +178,26 @@ class GGPRequestHandler(BaseHTTPRequestHandler):
 
 #########
 
+# reads the command line, returns (port, log) or exits with the usage text of the script
+def parse_arguments(default_port, usage):
+    args = sys.argv[1:]
+    log = "--log" in args
+    args = [arg for arg in args if arg != "--log"]
+    port = default_port
+    if len(args) == 1:
+        try:
+            port = int(args[0])
+        except ValueError:
+            sys.exit(usage.strip())
+    elif len(args) != 0:
+        sys.exit(usage.strip())
+    return port, log
+
+def serve(agent, port, log=False):
+    httpd = GamePlayer(agent, port, log)
+    print(type(agent).__name__ + " is listening on port " + str(port) + " ...")
+    httpd.serve_forever()
+
 def main():
     # TODO: use your own agent here
     
@@ -142,27 +205,30 @@ def main():
     #search = AlphaBeta(SimpleEvaluation())
     #search = AlphaBeta_iterative_deepening(SimpleEvaluation())
     search = AlphaBeta_iterative_deepening_new(SimpleEvaluation())
+    #search = AlphaBeta_iterative_deepening_new(SimpleEvaluation(), pvs=True) # principal variation search
+    #search = AlphaBeta_iterative_deepening_new(SimpleEvaluation(), pvs=True, aspiration=2) # pvs + aspiration windows
+    #from parallel_search import ParallelSearch
+    #search = ParallelSearch(SimpleEvaluation(), n_processes=8) # root moves split between 8 processes
+    #from mcts import MCTS
+    #search = MCTS(playout_depth=8) # Monte Carlo tree search, no evaluation function
+    #search = MCTS(playout_depth=8, n_processes=8) # 8 independent trees, root moves voted by visits
     
     #agent = RandomAgent()
     #agent = RandomLegalAgent(search)
     
     
     agent = MyAgent(search)
+    #from bitboard import BitboardEnvironment
+    #agent = MyAgent(search, BitboardEnvironment)
+    #agent = MyAgent(search, ponder=True) # keep searching while the opponent thinks
+    #from telemetry import Telemetry
+    #agent = MyAgent(search, telemetry=Telemetry("telemetry.jsonl")) # search statistics of every move as JSON lines
 
     # read command line argument(s)
-    port = 4001
-    if len(sys.argv) == 2:
-        try:
-            port = int(sys.argv[1])
-        except ValueError:
-            sys.exit(globals()['__doc__'].strip())
-    elif len(sys.argv) != 1:
-        sys.exit(globals()['__doc__'].strip())
+    port, log = parse_arguments(4001, globals()['__doc__'])
 
     # start the game player server
-    httpd = GamePlayer(agent, port)
-    print(type(agent).__name__ + " is listening on port " + str(port) + " ...")
-    httpd.serve_forever()
+    serve(agent, port, log)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,274 @@
+import math
+import multiprocessing
+import random
+
+from search import SearchAlgorithm
+from bitboard import BitboardEnvironment, BitboardState
+from timing import SearchClock
+
+WHITE, BLACK = "W", "B"
+
+
+# a node of the search tree, one per position that was reached by a playout
+# wins are counted for the player who made the move that leads to the node (a draw counts 1/2)
+# there are no links back to the parent, so a tree that is thrown away is freed at once without the garbage collector
+class Node:
+    __slots__ = ("move", "children", "untried", "visits", "wins", "white", "black", "white_turn", "winner")
+
+    def __init__(self, move, state, env):
+        self.move = move
+        self.children = []
+        self.visits = 0
+        self.wins = 0.0
+        self.white, self.black, self.white_turn = state.white, state.black, state.white_turn
+        game_over, self.winner, self.untried = env.get_status(state)
+
+    def uct_child(self, exploration):
+        log_visits = math.log(self.visits)
+        return max(self.children,
+                   key=lambda c: c.wins / c.visits + exploration * math.sqrt(log_visits / c.visits))
+
+
+# Monte Carlo tree search with UCT, every iteration walks down the tree, adds one node and plays the game
+# out with random moves, so it needs no evaluation function at all
+# the tree and the playouts always work on bitboards, whatever the environment of the agent is
+# the tree of the last search is kept, if the position after our move and the opponent's reply is in it,
+# the next search starts from that subtree
+class MCTS(SearchAlgorithm):
+
+    # exploration: the UCT constant
+    # max_playouts: playouts per search, the search also stops when the play clock runs out
+    # playout_depth: a playout that is not over after that many plies is won by the side that is ahead
+    #   in pieces + advance (like Evaluation_v1), None plays every game to the end
+    # n_processes: > 1 runs that many independent searches in worker processes and adds up the visits
+    #   of the root moves (root parallel), the tree is not kept between moves then
+    def __init__(self, evaluation=None, exploration=1.0, max_playouts=100000, playout_depth=None, n_processes=1,
+                 seed=None):
+        super().__init__(evaluation)
+        self.exploration = exploration
+        self.playout_depth = playout_depth
+        self.max_playouts = max_playouts
+        self.n_processes = n_processes
+        self.rng = random.Random(seed)
+        self.clock = SearchClock()
+        self.pool = None
+        self.root = None
+        self.n_expansions = 0
+        self.depth_reached = 0
+        self.search_info = {}
+
+    def init_evaluation(self, env, play_clock):
+        if self.evaluations is not None:
+            self.evaluations.init(env)
+        self.env = BitboardEnvironment(env.width, env.height)
+        self.play_clock = play_clock
+        self.root = None
+        self.n_expansions = 0
+        if self.n_processes > 1 and self.pool is None:
+            self.pool = multiprocessing.Pool(self.n_processes)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+    # the state of the agent's environment as a BitboardState
+    def bitboard_state(self, state):
+        if isinstance(state, BitboardState):
+            return state.clone()
+        bitboard = BitboardState(state.width, state.height)
+        bitboard.set_board(state.board, state.white_turn)
+        return bitboard
+
+    # the node of the tree of the last search for this position (two plies down: our move and the reply),
+    # or a new root
+    def find_root(self, state):
+        candidates = [self.root] if self.root is not None else []
+        for ply in range(2):
+            candidates = candidates + [child for node in candidates for child in node.children]
+        for node in candidates:
+            if (node.white, node.black, node.white_turn) == (state.white, state.black, state.white_turn):
+                node.move = None
+                return node
+        return Node(None, state, self.env)
+
+    # random playout from the state, returns (winner "W", "B" or 0, number of plies played)
+    # lightly guided: a move to the last row is always played, so a won position is not thrown away,
+    # and a piece of the opponent that could move to the last row is captured if that is possible
+    def playout(self, state):
+        env = self.env
+        rng = self.rng
+        white, black, white_turn = state.white, state.black, state.white_turn
+        full, top_row, bottom_row = env.full, env.top_row, env.bottom_row
+        n_plies = 0
+        max_plies = self.playout_depth if self.playout_depth is not None else float('inf')
+        while True:
+            if n_plies >= max_plies:
+                k = bin(white).count("1") - bin(black).count("1")
+                if white:
+                    k += (white.bit_length() - 1) // env.width
+                if black:
+                    k -= env.height - 1 - ((black & -black).bit_length() - 1) // env.width
+                return (WHITE if k > 0 else BLACK if k < 0 else 0), n_plies
+            empty = ~(white | black) & full
+            if white_turn:
+                targets = [(shift, ((white & mask) << shift) & empty) for shift, mask in env.white_quiet]
+                targets += [(shift, ((white & mask) << shift) & black) for shift, mask in env.white_captures]
+                if any(bits & top_row for shift, bits in targets):
+                    return WHITE, n_plies
+            else:
+                targets = [(-shift, ((black & mask) >> shift) & empty) for shift, mask in env.black_quiet]
+                targets += [(-shift, ((black & mask) >> shift) & white) for shift, mask in env.black_captures]
+                if any(bits & bottom_row for shift, bits in targets):
+                    return BLACK, n_plies
+            # pieces of the opponent that reach the last row with their next move
+            if white_turn:
+                threats = 0
+                for shift, mask in env.black_quiet:
+                    threats |= ((((black & mask) >> shift) & empty & bottom_row) << shift)
+                for shift, mask in env.black_captures:
+                    threats |= ((((black & mask) >> shift) & white & bottom_row) << shift)
+            else:
+                threats = 0
+                for shift, mask in env.white_quiet:
+                    threats |= ((((white & mask) << shift) & empty & top_row) >> shift)
+                for shift, mask in env.white_captures:
+                    threats |= ((((white & mask) << shift) & black & top_row) >> shift)
+            if threats:
+                defences = [(shift, bits & threats) for shift, bits in targets[4:] if bits & threats]
+                if defences:
+                    targets = defences
+            n_moves = sum(bin(bits).count("1") for shift, bits in targets)
+            if n_moves == 0:
+                return 0, n_plies
+            # the k-th of all the moves, found without making the list of moves
+            k = rng.randrange(n_moves)
+            for shift, bits in targets:
+                count = bin(bits).count("1")
+                if k < count:
+                    break
+                k -= count
+            for i in range(k):
+                bits &= bits - 1
+            to = bits & -bits
+            start = to >> shift if shift > 0 else to << -shift
+            if white_turn:
+                white ^= start | to
+                black &= ~to
+            else:
+                black ^= start | to
+                white &= ~to
+            white_turn = not white_turn
+            n_plies += 1
+
+    # runs playouts from the root until the clock runs out or max_playouts is reached
+    # returns (number of playouts, number of playout plies)
+    def run(self, root):
+        env = self.env
+        state = BitboardState(env.width, env.height)
+        n_playouts, n_plies = 0, 0
+        while n_playouts < self.max_playouts:
+            if (n_playouts & 15) == 0 and self.clock.remaining() <= 0:
+                break
+            # selection, state follows the path from the root
+            node = root
+            path = [root]
+            state.white, state.black, state.white_turn = root.white, root.black, root.white_turn
+            while not node.untried and node.children:
+                node = node.uct_child(self.exploration)
+                env.move(state, node.move)
+                path.append(node)
+            # expansion
+            if node.untried:
+                move = node.untried.pop(self.rng.randrange(len(node.untried)))
+                env.move(state, move)
+                node = Node(move, state, env)
+                path[-1].children.append(node)
+                path.append(node)
+                self.n_expansions += 1
+            self.depth_reached = max(self.depth_reached, len(path) - 1)
+            # simulation
+            if node.winner is not None:
+                winner, plies = node.winner, 0
+            else:
+                winner, plies = self.playout(state)
+            n_playouts += 1
+            n_plies += plies
+            # backpropagation
+            for node in path:
+                node.visits += 1
+                if winner == 0:
+                    node.wins += 0.5
+                elif (winner == WHITE) != node.white_turn:
+                    # the player who moved to this node is not the player to move in it
+                    node.wins += 1
+        return n_playouts, n_plies
+
+    # (move, visits, wins) of every root move searched so far
+    def root_statistics(self, root):
+        return [(child.move, child.visits, child.wins) for child in root.children]
+
+    def do_search(self, env, player, depth):
+        self.clock.start(self.play_clock)
+        self.depth_reached = 0
+        expansions_start = self.n_expansions
+        state = self.bitboard_state(env.current_state)
+        if self.n_processes > 1:
+            tasks = [(state.width, state.height, state.white, state.black, state.white_turn,
+                      self.exploration, -(-self.max_playouts // self.n_processes), self.playout_depth,
+                      self.clock.remaining(), self.rng.randrange(1 << 30)) for i in range(self.n_processes)]
+            totals = {}
+            n_playouts, n_plies = 0, 0
+            for statistics, playouts, plies, expansions, depth_reached in self.pool.map(search_worker, tasks):
+                for move, visits, wins in statistics:
+                    total = totals.setdefault(move, [0, 0.0])
+                    total[0] += visits
+                    total[1] += wins
+                n_playouts += playouts
+                n_plies += plies
+                self.n_expansions += expansions
+                self.depth_reached = max(self.depth_reached, depth_reached)
+            statistics = [(move, visits, wins) for move, (visits, wins) in totals.items()]
+            reused = 0
+        else:
+            self.root = self.find_root(state)
+            reused = self.root.visits
+            n_playouts, n_plies = self.run(self.root)
+            statistics = self.root_statistics(self.root)
+        if statistics:
+            move, visits, wins = max(statistics, key=lambda s: s[1])
+            score = wins / visits
+        else:
+            # no playout finished in time, any legal move is better than none
+            move, visits, score = env.get_legal_moves(env.current_state)[0], 0, None
+        self.search_info = {
+            "move": move,
+            "score": score,
+            "depth": self.depth_reached,
+            "stop_reason": "playouts" if n_playouts >= self.max_playouts else "timeout",
+            "nodes": self.n_expansions - expansions_start,
+            "playouts": n_playouts,
+            "playout_plies": n_plies,
+            "reused_playouts": reused,
+            "processes": self.n_processes,
+        }
+        return move
+
+    def get_nb_state_expansions(self):
+        return self.n_expansions
+
+
+# task = (width, height, white, black, white_turn, exploration, max_playouts, playout_depth, time_left, seed)
+# one independent search of a root parallel MCTS, returns (root statistics, playouts, playout plies,
+# expansions, depth reached)
+def search_worker(task):
+    width, height, white, black, white_turn, exploration, max_playouts, playout_depth, time_left, seed = task
+    search = MCTS(exploration=exploration, max_playouts=max_playouts, playout_depth=playout_depth, seed=seed)
+    search.env = BitboardEnvironment(width, height)
+    search.clock.margin = 0
+    search.clock.start(time_left)
+    state = BitboardState(width, height)
+    state.white, state.black, state.white_turn = white, black, white_turn
+    root = Node(None, state, search.env)
+    n_playouts, n_plies = search.run(root)
+    return search.root_statistics(root), n_playouts, n_plies, search.n_expansions, search.depth_reached
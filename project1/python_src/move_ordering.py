@@ -0,0 +1,60 @@
+# move ordering for the alpha-beta searchers: the transposition table move first, then captures,
+# then the killer moves of the ply and the rest by history score
+# the tables are kept between iterations and between searches, so later searches start out well ordered
+class MoveOrdering:
+    def __init__(self, max_ply=128):
+        self.max_ply = max_ply
+        self.clear()
+
+    def clear(self):
+        # two killer moves per ply (quiet moves that caused a cutoff at the same ply somewhere else in the tree)
+        self.killers = [[None, None] for i in range(self.max_ply)]
+        # move -> history score, moves are (x1, y1, x2, y2) so white and black moves never share an entry
+        self.history = {}
+        self.n_cutoffs = 0
+        self.n_first_move_cutoffs = 0
+
+    # called at the start of every search, old history scores count less than new ones
+    def new_search(self):
+        for move in self.history:
+            self.history[move] >>= 1
+        self.n_cutoffs = 0
+        self.n_first_move_cutoffs = 0
+
+    # sorts moves in place, best first
+    def order(self, moves, ply, tt_move=None):
+        history = self.history
+        killer1, killer2 = self.killers[ply] if ply < self.max_ply else (None, None)
+        def score(move):
+            if move == tt_move:
+                return 3 << 40
+            x1, y1, x2, y2 = move
+            if x2 - x1 in (1, -1) and y2 - y1 in (1, -1): # capture
+                return 2 << 40
+            if move == killer1 or move == killer2:
+                return 1 << 40
+            return history.get(move, 0)
+        moves.sort(key=score, reverse=True)
+        return moves
+
+    # move caused a beta cutoff at this ply, index is its position in the ordered move list
+    def record_cutoff(self, move, ply, depth, index):
+        self.n_cutoffs += 1
+        if index == 0:
+            self.n_first_move_cutoffs += 1
+        x1, y1, x2, y2 = move
+        if x2 - x1 in (1, -1) and y2 - y1 in (1, -1):
+            # captures are tried early anyway
+            return
+        if ply < self.max_ply:
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+        self.history[move] = self.history.get(move, 0) + depth*depth
+
+    # fraction of the cutoffs that came from the first move tried, the closer to 1 the better the ordering
+    def first_move_cutoff_rate(self):
+        if self.n_cutoffs == 0:
+            return 0.0
+        return self.n_first_move_cutoffs / self.n_cutoffs
@@ -2,14 +2,24 @@ from agent import Agent
 from environment import Environment
 import random
 from search import *
+from tablebase import Tablebase
+from opening_book import OpeningBook
 
+import threading
 import time
 # my main agent class
 
 class MyAgent(Agent):
     search_algorithm = None
     
-    def __init__(self, search_algorithm) -> None:
+    # environment_class is Environment (list of lists board) or BitboardEnvironment
+    # ponder: keep searching in a background thread while the opponent is thinking,
+    # needs a search algorithm with ponder() (AlphaBeta_iterative_deepening_new)
+    # telemetry: telemetry.Telemetry that gets a record with the search statistics of every move, or None
+    # verbose: print the moves and the score of every search, by default only when there is no telemetry,
+    # so the records written to stdout are not mixed with text
+    def __init__(self, search_algorithm, environment_class=Environment, ponder=False, telemetry=None,
+                 verbose=None) -> None:
         self.role = None
         self.play_clock = None
         self.my_turn = False
@@ -17,11 +27,22 @@ class MyAgent(Agent):
         self.height = 0
         self.env = None
         self.search_algorithm = search_algorithm
+        self.environment_class = environment_class
+        self.ponder = ponder
+        self.ponder_thread = None
+        self.predicted_move = None
+        self.telemetry = telemetry
+        self.verbose = verbose if verbose is not None else telemetry is None
+        # seconds of the play clock the game player server needs outside of next_action, set by gameplayer.GamePlayer
+        self.overhead = 0.0
     
 
     # start() is called once before you have to select the first action. Use it to initialize the agent.
     # role is either "white" or "black" and play_clock is the number of seconds after which nextAction must return.
     def start(self, role, width, height, play_clock):
+        # a match that ended without STOP (ABORT) may have left the pondering thread running,
+        # it must not keep writing into the tables init_evaluation() clears for this match
+        self.stop_pondering()
         self.play_clock = play_clock
         self.role = role
         self.my_turn = role != 'white'
@@ -30,28 +51,47 @@ class MyAgent(Agent):
         self.width = width
         self.height = height
         # TODO: add your own initialization code here
-        self.env = Environment(width, height)
+        # the Environment builds the move tables for this board size, so they are ready before the first search
+        self.env = self.environment_class(width, height)
         
         self.search_algorithm.init_evaluation(self.env, self.play_clock) # initialize the search algorithm
+        if hasattr(self.search_algorithm, "tablebase"):
+            # exact values for the endgame if a tablebase was built for this board size (see tablebase.py)
+            self.search_algorithm.tablebase = Tablebase.load(width, height)
+        # book moves for the first plies if a book was built for this board size (see opening_book.py)
+        self.book = OpeningBook.load(width, height)
         
         self.depth = 12 # set the depth of the search algorithm
         
         self.total_time = 0
+        self.n_ponder_hits = 0
+        self.n_moves = 0
+        self.ponder_hit = False
  
     def next_action(self, last_action):
+        # the pondering thread works on self.env, so it has to be stopped before the state is changed
+        self.stop_pondering()
         if last_action:
             if self.my_turn and self.role == 'white' or not self.my_turn and self.role != 'white':
                 last_player = 'white'
             else:
                 last_player = 'black'
-            print("%s moved from %s to %s" % (last_player, str(last_action[0:2]), str(last_action[2:4])))
+            if self.verbose:
+                print("%s moved from %s to %s" % (last_player, str(last_action[0:2]), str(last_action[2:4])))
             # TODO: 1. update your internal world model according to the action that was just executed
-            last_action = (x - 1 for x in last_action)
+            last_action = tuple(x - 1 for x in last_action)
+            if self.predicted_move is not None and last_action == self.predicted_move:
+                # the tables already hold the search of the position we are in now
+                self.n_ponder_hits += 1
+                self.ponder_hit = True
+                if self.verbose:
+                    print("ponder hit, total: ", self.n_ponder_hits)
+            self.predicted_move = None
             self.env.move(self.env.current_state, last_action)
             #print()
             #print(self.env.current_state)
             #print()
-        else:
+        elif self.verbose:
             print("first move!")
 
         # update turn (above that line it myTurn is still for the previous state)
@@ -63,27 +103,54 @@ class MyAgent(Agent):
             #print()
             #print(self.env.current_state)
             #print()
-            print()
             t_move_start = time.time()        
-            ultra_move = self.search_algorithm.do_search(self.env, self.role, self.depth)
-            n_expansions = self.search_algorithm.get_nb_state_expansions()
-            t_end = time.time()
-            time_for_move = t_end - t_move_start
+            ultra_move = self.book.get(self.env.current_state) if self.book is not None else None
+            book_move = ultra_move is not None and ultra_move in self.env.get_legal_moves(self.env.current_state)
+            if not book_move:
+                self.search_algorithm.play_clock = self.play_clock - self.overhead
+                ultra_move = self.search_algorithm.do_search(self.env, self.role, self.depth)
+            time_for_move = time.time() - t_move_start
             self.total_time += time_for_move
-            
-            print("Time for move calculation", time_for_move, " s")
-            print("Total time calculating", self.total_time, " s")
-            print("ultimate move: ", ultra_move)
-            #print("moves: ", self.env.get_legal_moves(self.env.current_state))
-            print("n_expansions: ", n_expansions)
-            if self.total_time != 0: print("n_expansion_per_second: ", n_expansions/(self.total_time))
-            print()
+            self.n_moves += 1
+            if self.verbose:
+                print("move: ", ultra_move)
+                if not book_move:
+                    print("VALUE: ", getattr(self.search_algorithm, "search_info", {}).get("score"))
+            if self.telemetry is not None:
+                record = {} if book_move else dict(getattr(self.search_algorithm, "search_info", {}))
+                record.update(role=self.role, width=self.width, height=self.height, play_clock=self.play_clock,
+                              move_number=self.n_moves, move=ultra_move, book_move=book_move,
+                              ponder_hit=self.ponder_hit, move_time=round(time_for_move, 6),
+                              total_time=round(self.total_time, 6), overhead=round(self.overhead, 6))
+                self.telemetry.record(**record)
+            self.ponder_hit = False
             
             x1, y1, x2, y2 = ultra_move[0]+1, ultra_move[1]+1, ultra_move[2]+1, ultra_move[3]+1
             return "(move " + " ".join(map(str, [x1, y1, x2, y2])) + ")"
         else:
+            if self.ponder and not self.env.is_terminal(self.env.current_state)[0]:
+                self.start_pondering()
             return "noop"
 
+    def cleanup(self, last_move):
+        self.stop_pondering()
+        return
+
+    # searches the position with the opponent to move in a background thread until the next call to next_action
+    def start_pondering(self):
+        def ponder():
+            self.predicted_move = self.search_algorithm.ponder(self.env, self.role, self.depth)
+        # the clock is started here and not in the thread, so a stop_pondering() right after this can't be missed
+        self.search_algorithm.start_pondering()
+        self.ponder_thread = threading.Thread(target=ponder, daemon=True)
+        self.ponder_thread.start()
+
+    def stop_pondering(self):
+        if self.ponder_thread is not None:
+            self.search_algorithm.stop_pondering()
+            self.ponder_thread.join()
+            self.ponder_thread = None
+
 
 
 
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+"""
+Builds an opening book for Knightthrough: the move to play in every position of the first plies
+that the agent can end up in, found with a long iterative deepening search.
+For both roles the book follows every reply of the opponent but only the book move of the player.
+Usage: opening_book.py width height [--plies 3] [--seconds 10] [--file file]
+Example: opening_book.py 8 8 --plies 3 --seconds 10
+the default file is books/knightthrough_<width>x<height>.book, which MyAgent.start() loads if it exists,
+without a book file for the board size the agent searches every move itself
+The books in books/ cover the board sizes of the knightthrough_*.gdl files, 3 plies, 30 seconds per position
+(three times the 10 second play clock of the kiosk matches) with SimpleEvaluation and pvs, built with
+for size in "3 5" "5 5" "6 6" "7 7" "8 8" "9 9" "10 10"; do opening_book.py $size --plies 3 --seconds 30; done
+rebuild them after a change of the evaluation or the search
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import struct
+
+from bitboard import BitboardEnvironment
+from search import AlphaBeta_iterative_deepening_new, SimpleEvaluation
+
+BOOK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "books")
+MAGIC = b"KTOB"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBI") # magic, version, width, height, number of entries
+ENTRY = struct.Struct("<QBBBB") # zobrist hash of the position, move (x1, y1, x2, y2)
+
+def book_path(width, height):
+    return os.path.join(BOOK_DIR, f"knightthrough_{width}x{height}.book")
+
+
+# the book moves of one board size, keyed by the zobrist hash of the position (State.hash / BitboardState.hash)
+class OpeningBook:
+    def __init__(self, width, height, moves=None):
+        self.width = width
+        self.height = height
+        self.moves = moves if moves is not None else {}
+
+    # opens the book of the board size if there is one, otherwise returns None
+    @staticmethod
+    def load(width, height):
+        path = book_path(width, height)
+        if not os.path.exists(path):
+            return None
+        return OpeningBook.read(path)
+
+    @staticmethod
+    def read(path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, width, height, n_entries = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise RuntimeError("not a knightthrough opening book: " + path)
+        moves = {}
+        for key, x1, y1, x2, y2 in ENTRY.iter_unpack(data[HEADER.size:HEADER.size + n_entries*ENTRY.size]):
+            moves[key] = (x1, y1, x2, y2)
+        return OpeningBook(width, height, moves)
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.width, self.height, len(self.moves)))
+            for key in sorted(self.moves):
+                f.write(ENTRY.pack(key, *self.moves[key]))
+
+    # the book move of the state or None
+    def get(self, state):
+        return self.moves.get(state.hash)
+
+    def __len__(self):
+        return len(self.moves)
+
+
+# fills an OpeningBook by searching every position of the first plies where it is the book side's turn
+class OpeningBookBuilder:
+    def __init__(self, width, height, plies, seconds, search=None):
+        self.env = BitboardEnvironment(width, height)
+        self.book = OpeningBook(width, height)
+        self.plies = plies
+        self.seconds = seconds
+        self.search = search if search is not None else AlphaBeta_iterative_deepening_new(SimpleEvaluation(), pvs=True)
+
+    def build(self):
+        for role in ("white", "black"):
+            self.add_positions(self.env.current_state, role, 0)
+        return self.book
+
+    def add_positions(self, state, role, ply):
+        if ply >= self.plies:
+            return
+        game_over, winner, moves = self.env.get_status(state)
+        if game_over:
+            return
+        if state.white_turn == (role == "white"):
+            if state.hash not in self.book.moves:
+                self.book.moves[state.hash] = self.search_position(role)
+                print(f"{role} ply {ply}: {self.book.moves[state.hash]} ({len(self.book)} positions)")
+            moves = [self.book.moves[state.hash]]
+        for move in moves:
+            undo = self.env.move(state, move)
+            self.add_positions(state, role, ply + 1)
+            self.env.undo_move(state, undo)
+
+    def search_position(self, role):
+        # a new game for every position, so no scores from another position are left in the tables
+        self.search.init_evaluation(self.env, self.seconds)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.search.do_search(self.env, role, 100)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Builds an opening book for Knightthrough")
+    parser.add_argument("width", type=int)
+    parser.add_argument("height", type=int)
+    parser.add_argument("--plies", type=int, default=3, help="number of plies from the start position the book covers")
+    parser.add_argument("--seconds", type=float, default=10, help="search time for every book position")
+    parser.add_argument("--file", default=None)
+    args = parser.parse_args()
+    path = args.file or book_path(args.width, args.height)
+    book = OpeningBookBuilder(args.width, args.height, args.plies, args.seconds).build()
+    book.write(path)
+    print(f"wrote {len(book)} positions to {path}")
+
+
+if __name__ == "__main__":
+    main()
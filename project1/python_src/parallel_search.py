@@ -0,0 +1,176 @@
+import multiprocessing
+import threading
+import time
+
+from search import *
+from timing import SearchClock, SearchTimeout
+
+
+# every worker process keeps one AlphaBeta_iterative_deepening_new and one environment per board size,
+# so its transposition table and move ordering tables stay warm from one task to the next
+worker_search = None
+worker_envs = {}
+worker_player = None
+worker_search_id = None
+
+def init_worker(evaluation, search_options):
+    global worker_search
+    worker_search = AlphaBeta_iterative_deepening_new(evaluation, **search_options)
+
+# task = (environment_class, width, height, board, white_turn, player, move, depth, alpha, beta, time_left, search_id)
+# searches the position after move to depth - 1 and returns
+# (move, value or None if the time ran out, visited nodes, expanded nodes)
+# search_id changes with every do_search of ParallelSearch, the first task of a new one starts a new search
+# generation in the worker like a serial search does, so old table entries age and the history scores are decayed
+def search_root_move(task):
+    global worker_player, worker_search_id
+    environment_class, width, height, board, white_turn, player, move, depth, alpha, beta, time_left, search_id = task
+    key = (environment_class, width, height)
+    if key not in worker_envs:
+        worker_envs[key] = environment_class(width, height)
+    env = worker_envs[key]
+    if getattr(worker_search.evaluations, "env", None) is not env or worker_player != player:
+        # new board size or new role, the stored scores are no use anymore
+        worker_search.init_evaluation(env, time_left)
+        worker_player = player
+    if search_id != worker_search_id:
+        worker_search.tt.new_search()
+        worker_search.ordering.new_search()
+        worker_search_id = search_id
+    worker_search.player = player
+    worker_search.clock.start(time_left)
+    nodes_start, expansions_start = worker_search.n_nodes, worker_search.n_expansions
+
+    state = env.current_state
+    state.set_board(board, white_turn)
+    maximizing = white_turn == (player == "white")
+    env.move(state, move)
+    try:
+        if maximizing:
+            value, reply = worker_search.min_value(env, state, depth - 1, alpha, beta, 1)
+        else:
+            value, reply = worker_search.max_value(env, state, depth - 1, alpha, beta, 1)
+    except SearchTimeout:
+        value = None
+    return move, value, worker_search.n_nodes - nodes_start, worker_search.n_expansions - expansions_start
+
+
+# iterative deepening where the moves of the root are split between a pool of worker processes
+# the best move of the last iteration is searched first with the full window, then all the other moves
+# are searched at the same time with the window narrowed by its value (young brothers wait at the root)
+class ParallelSearch(SearchAlgorithm):
+
+    # n_processes: number of worker processes (default: one per core)
+    # search_options: passed on to the AlphaBeta_iterative_deepening_new of every worker (pvs, aspiration, ...)
+    def __init__(self, evaluation, n_processes=None, **search_options):
+        super().__init__(evaluation)
+        self.n_processes = n_processes or multiprocessing.cpu_count()
+        self.search_options = search_options
+        self.clock = SearchClock()
+        self.pool = None
+        self.n_nodes = 0
+        self.n_expansions = 0
+        self.search_id = 0
+        self.depth_reached = 0
+        self.search_info = {}
+
+    def init_evaluation(self, env, play_clock):
+        self.evaluations.init(env)
+        self.n_nodes = 0
+        self.n_expansions = 0
+        self.play_clock = play_clock
+        if self.pool is None:
+            # started once and reused for every game, starting processes is slow
+            self.pool = multiprocessing.Pool(self.n_processes, initializer=init_worker,
+                                             initargs=(self.evaluations, self.search_options))
+        return
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+    # returns the best move of the last iteration that was completed, the statistics are left in self.search_info
+    def parallel_search_iterative_deepening(self, game, state, depth):
+        maximizing = state.white_turn == (self.player == "white")
+        root_moves = game.get_legal_moves(state)
+        board = [list(row) for row in state.board]
+        best_move, value, best_value = root_moves[0], None, None
+        self.depth_reached = 0
+        nodes_start = self.n_nodes
+        times_per_iteration, nodes_per_iteration = [], []
+        stop_reason = "depth"
+        for i in range(1, depth+1):
+            if len(times_per_iteration) >= 2:
+                # predicted from the growth of the time per iteration, unlike the serial search the results of an
+                # iteration that is cut off are not used, so an iteration that cannot finish is not started
+                growth = times_per_iteration[-1] / max(times_per_iteration[-2], 1e-6)
+                if not self.clock.can_finish(times_per_iteration[-1] * growth):
+                    stop_reason = "predicted timeout"
+                    break
+            t_start_iteration = time.time()
+            nodes_start_iteration = self.n_nodes
+            results = self.search_moves(game, board, state.white_turn, root_moves[:1], i, float('-inf'), float('+inf'))
+            if results is not None and len(root_moves) > 1:
+                first_value = results[0][1]
+                if maximizing:
+                    alpha, beta = first_value, float('+inf')
+                else:
+                    alpha, beta = float('-inf'), first_value
+                others = self.search_moves(game, board, state.white_turn, root_moves[1:], i, alpha, beta)
+                results = results + others if others is not None else None
+            if results is None:
+                stop_reason = "timeout"
+                break
+            # best move first, the next iteration starts with it and hands out the most promising moves first
+            # (the values of moves that were not better than the first one are only bounds, but good enough for that)
+            results.sort(key=lambda r: r[1], reverse=maximizing)
+            best_move, value = results[0][0], results[0][1]
+            best_value = value
+            root_moves = [move for move, v, nodes, expansions in results]
+            times_per_iteration.append(time.time() - t_start_iteration)
+            nodes_per_iteration.append(self.n_nodes - nodes_start_iteration)
+            self.depth_reached = i
+            if value == (100 if maximizing else -100):
+                stop_reason = "decided"
+                break
+        self.search_info = {
+            "move": best_move,
+            "score": best_value,
+            "depth": self.depth_reached,
+            "stop_reason": stop_reason,
+            "nodes": self.n_nodes - nodes_start,
+            "iteration_nodes": nodes_per_iteration,
+            "iteration_times": [round(t, 6) for t in times_per_iteration],
+            "ebf": nodes_per_iteration[-1] / max(nodes_per_iteration[-2], 1) if len(nodes_per_iteration) >= 2 else None,
+            "processes": self.n_processes,
+        }
+        return best_move
+
+    # searches the moves in the worker processes, returns a list of (move, value, visited nodes, expanded nodes)
+    # or None if the time ran out
+    def search_moves(self, game, board, white_turn, moves, depth, alpha, beta):
+        # a search without a time limit (play clock float('inf')) still needs a finite timeout for the wait below,
+        # the lock behind it raises OverflowError for anything above threading.TIMEOUT_MAX
+        time_left = min(self.clock.remaining(), threading.TIMEOUT_MAX)
+        tasks = [(type(game), game.width, game.height, board, white_turn, self.player,
+                  move, depth, alpha, beta, time_left, self.search_id) for move in moves]
+        result = self.pool.map_async(search_root_move, tasks)
+        try:
+            results = result.get(timeout=max(min(self.clock.remaining(), threading.TIMEOUT_MAX), 0))
+        except multiprocessing.TimeoutError:
+            return None
+        self.n_nodes += sum(nodes for move, value, nodes, expansions in results)
+        self.n_expansions += sum(expansions for move, value, nodes, expansions in results)
+        if any(value is None for move, value, nodes, expansions in results):
+            return None
+        return results
+
+    def do_search(self, env, player, depth):
+        self.player = player
+        self.search_id += 1
+        self.clock.start(self.play_clock)
+        return self.parallel_search_iterative_deepening(env, env.current_state, depth)
+
+    def get_nb_state_expansions(self):
+        return self.n_expansions
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""
+Perft for Knightthrough: counts the positions at depth N from the start position, for every board size
+of the knightthrough_*.gdl files, and compares the counts with the stored reference counts.
+Usage: perft.py [--sizes 5x5 8x8] [--depth 4] [--bitboard] [--check]
+Example: perft.py --sizes 8x8 --depth 4 --check
+--check also verifies after every move that the hash and features kept up to date by move() are the same as
+computed from scratch, and after every undo_move() that the state is exactly the same as before the move (slow)
+"""
+
+import argparse
+import copy
+import glob
+import os
+import re
+import sys
+import time
+
+from environment import Environment
+from bitboard import BitboardEnvironment
+from benchmark import board_size
+
+# positions at depth 0, 1, 2, ... from the start position, a game that is over before the last depth
+# is not counted any further (it has no moves), a position at the last depth is counted even if the game is over
+REFERENCE_COUNTS = {
+    (3, 5): [1, 6, 34, 186, 1030, 5364, 28632, 137434],
+    (5, 5): [1, 14, 188, 2336, 28766, 336542],
+    (6, 6): [1, 28, 738, 18174, 425006],
+    (7, 7): [1, 34, 1134, 36784, 1169138],
+    (8, 8): [1, 40, 1600, 63348, 2496056],
+    (9, 9): [1, 46, 2116, 96636],
+    (10, 10): [1, 52, 2704, 139776],
+}
+
+def perft(env, state, depth):
+    if depth == 0:
+        return 1
+    game_over, winner, moves = env.get_status(state)
+    if game_over:
+        return 0
+    n = 0
+    for move in moves:
+        undo = env.move(state, move)
+        n += perft(env, state, depth - 1)
+        env.undo_move(state, undo)
+    return n
+
+# every attribute of the state (the states have __slots__ instead of vars()), lists are copied
+def state_fields(state):
+    return {name: copy.deepcopy(getattr(state, name)) for name in type(state).__slots__}
+
+# the state as move() leaves it must be the same as the state set up from scratch with set_board()
+def recomputed(state):
+    fresh = state.clone()
+    fresh.set_board(state.board, state.white_turn)
+    return state_fields(fresh)
+
+# perft that raises RuntimeError as soon as move() or undo_move() leaves the state wrong
+def perft_checked(env, state, depth):
+    if depth == 0:
+        return 1
+    game_over, winner, moves = env.get_status(state)
+    if game_over:
+        return 0
+    n = 0
+    for move in moves:
+        before = state_fields(state)
+        undo = env.move(state, move)
+        if state_fields(state) != recomputed(state):
+            raise RuntimeError(f"move {move} left a wrong state:\n{state}\n{state_fields(state)}\n{recomputed(state)}")
+        n += perft_checked(env, state, depth - 1)
+        env.undo_move(state, undo)
+        if state_fields(state) != before:
+            raise RuntimeError(f"undo of move {move} did not restore the state:\n{state}\n{state_fields(state)}\n{before}")
+    return n
+
+# board sizes of the knightthrough_*.gdl files next to python_src
+def gdl_board_sizes():
+    sizes = []
+    for path in glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "knightthrough_*.gdl")):
+        with open(path) as f:
+            rules = f.read()
+        width = re.search(r'\(\s*width\s+(\d+)\s*\)', rules)
+        height = re.search(r'\(\s*height\s+(\d+)\s*\)', rules)
+        if width and height:
+            sizes.append((int(width.group(1)), int(height.group(1))))
+    return sorted(sizes)
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft for Knightthrough")
+    parser.add_argument("--sizes", type=board_size, nargs="+", default=None,
+                        help="board sizes (default: all sizes of the knightthrough_*.gdl files)")
+    parser.add_argument("--depth", type=int, default=None,
+                        help="maximum depth (default: the deepest reference count of the size)")
+    parser.add_argument("--bitboard", action="store_true", help="use BitboardEnvironment instead of Environment")
+    parser.add_argument("--check", action="store_true", help="verify move/undo_move at every node (slow)")
+    args = parser.parse_args()
+    environment_class = BitboardEnvironment if args.bitboard else Environment
+    count = perft_checked if args.check else perft
+
+    n_wrong = 0
+    print(f"{'size':>6} {'depth':>5} {'positions':>12} {'expected':>12} {'seconds':>9} {'positions/s':>12}")
+    for width, height in args.sizes or gdl_board_sizes():
+        reference = REFERENCE_COUNTS.get((width, height), [])
+        max_depth = args.depth if args.depth is not None else max(len(reference) - 1, 3)
+        env = environment_class(width, height)
+        for depth in range(1, max_depth + 1):
+            t_start = time.time()
+            n = count(env, env.current_state, depth)
+            seconds = time.time() - t_start
+            expected = reference[depth] if depth < len(reference) else None
+            status = "" if expected is None or n == expected else "  WRONG"
+            n_wrong += bool(status)
+            print(f"{f'{width}x{height}':>6} {depth:5} {n:12} {expected if expected is not None else '-':>12} "
+                  f"{seconds:9.2f} {n/max(seconds, 1e-9):12.0f}{status}")
+    if n_wrong:
+        print(f"{n_wrong} counts are wrong")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,13 @@
 import collections
 import heapq
+import json
+import os
 import time
-import copy
+
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from move_ordering import MoveOrdering
+from timing import SearchClock, SearchTimeout
+from tablebase import UNKNOWN, decode
 
 
 WHITE, BLACK, EMPTY = "W", "B", " "
@@ -21,12 +27,9 @@ class Evaluations:
 # -100 if lose
 # 0 if draw
 # most advanced black piece - most advanced white piece
+# all evaluations read the piece counts and advances the state keeps up to date, so they are O(1)
 class SimpleEvaluation(Evaluations):
     def eval(self, state, player, winner=None):
-        k = 0
-        #legal_moves = self.env.get_legal_moves(state)
-        height = self.env.height - 1
-        
         if player == "white":
             if winner == WHITE:
                 return 100
@@ -34,15 +37,7 @@ class SimpleEvaluation(Evaluations):
                 return -100
             elif winner == 0: #draw
                 return 0
-            
-            for idx, i in enumerate(reversed(state.board)):
-                if WHITE in i:
-                    k += height - idx
-                    break    
-            for idx, i in enumerate(state.board):
-                if BLACK in i:
-                    k -= height - idx
-                    break
+            return state.white_advance - state.black_advance
         else:
             if winner == WHITE:
                 return -100
@@ -50,24 +45,12 @@ class SimpleEvaluation(Evaluations):
                 return 100
             elif winner == 0: #draw
                 return 0
-            for idx, i in enumerate(reversed(state.board)):
-                if WHITE in i:
-                    k -= height - idx
-                    break    
-            for idx, i in enumerate(state.board):
-                if BLACK in i:
-                    k += height - idx
-                    break
-        return k
+            return state.black_advance - state.white_advance
 
 # same as SimpleEvaluation but counts white and black pieces
 # and takes the difference of the number of pieces
 class Evaluation_v1(Evaluations):
     def eval(self, state, player, winner=None):
-        k = 0
-        #legal_moves = self.env.get_legal_moves(state)
-        height = self.env.height - 1
-        
         if player == "white":
             if winner == WHITE:
                 return 100
@@ -75,19 +58,8 @@ class Evaluation_v1(Evaluations):
                 return -100
             elif winner == 0: #draw
                 return 0
-            
-            for idx, i in enumerate(reversed(state.board)):
-                if WHITE in i:
-                    k += height - idx
-                    break    
-            for idx, i in enumerate(state.board):
-                if BLACK in i:
-                    k -= height - idx
-                    break
-            # count "WHITE" and "BLACK" in state.board
-            for i in state.board:
-                k += i.count(WHITE)
-                k -= i.count(BLACK)
+            k = state.white_advance - state.black_advance
+            k += state.white_count - state.black_count
         else:
             if winner == WHITE:
                 return -100
@@ -95,18 +67,8 @@ class Evaluation_v1(Evaluations):
                 return 100
             elif winner == 0: #draw
                 return 0
-            for idx, i in enumerate(reversed(state.board)):
-                if WHITE in i:
-                    k -= height - idx
-                    break    
-            for idx, i in enumerate(state.board):
-                if BLACK in i:
-                    k += height - idx
-                    break
-            #count "WHITE" and "BLACK" in state.board
-            for i in state.board:
-                k += i.count(BLACK)
-                k -= i.count(WHITE)
+            k = state.black_advance - state.white_advance
+            k += state.black_count - state.white_count
         return k
 
 
@@ -118,7 +80,6 @@ class Evaluation_v2(Evaluations):
         
         n_friendly_attacks, n_opponent_attacks = self.env.get_n_attacking_moves(state)
         
-        height = self.env.height - 1
         k += n_friendly_attacks
         #k -= n_opponent_attacks
 
@@ -129,18 +90,8 @@ class Evaluation_v2(Evaluations):
                 return -100
             elif winner == 0: #draw
                 return 0
-            for idx, i in enumerate(reversed(state.board)):
-                if WHITE in i:
-                    k += height - idx
-                    break    
-            for idx, i in enumerate(state.board):
-                if BLACK in i:
-                    k -= height - idx
-                    break
-            # count "WHITE" and "BLACK" in state.board
-            for i in state.board:
-                k += i.count(WHITE)
-                k -= i.count(BLACK)
+            k += state.white_advance - state.black_advance
+            k += state.white_count - state.black_count
         else:
             if winner == WHITE:
                 return -100
@@ -148,21 +99,53 @@ class Evaluation_v2(Evaluations):
                 return 100
             elif winner == 0: #draw
                 return 0
-            for idx, i in enumerate(reversed(state.board)):
-                if WHITE in i:
-                    k -= height - idx
-                    break    
-            for idx, i in enumerate(state.board):
-                if BLACK in i:
-                    k += height - idx
-                    break
-            #count "WHITE" and "BLACK" in state.board
-            for i in state.board:
-                k += i.count(BLACK)
-                k -= i.count(WHITE)
+            k += state.black_advance - state.white_advance
+            k += state.black_count - state.white_count
         return k
 
 
+# weights written by tuner.py
+WEIGHTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "evaluation_weights.json")
+
+# same features as Evaluation_v1 with weights fitted to game outcomes by tuner.py instead of +1 for everything,
+# from white's point of view: advance difference, piece difference and +1/-1 for white/black to move
+# the score is kept inside (-100, 100) so a won or lost game is always better or worse than any other position
+class TunedEvaluation(Evaluations):
+    FEATURES = ("advance", "material", "tempo")
+    DEFAULT_WEIGHTS = {"advance": 1.0, "material": 1.0, "tempo": 0.0}
+
+    def __init__(self, weights=None):
+        self.weights = dict(self.DEFAULT_WEIGHTS)
+        self.weights.update(weights or {})
+        # eval reads the weights from plain attributes, a dict lookup per feature costs as much as the features
+        self.advance = self.weights["advance"]
+        self.material = self.weights["material"]
+        self.tempo = self.weights["tempo"]
+
+    # the weights of tuner.py, or the hand made weights of Evaluation_v1 if there is no weights file
+    @classmethod
+    def load(cls, path=WEIGHTS_FILE):
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            return cls(json.load(f)["weights"])
+
+    def eval(self, state, player, winner=None):
+        if winner is not None:
+            if winner == 0:
+                return 0
+            return 100 if (winner == WHITE) == (player == "white") else -100
+        k = self.advance*(state.white_advance - state.black_advance) + self.material*(state.white_count - state.black_count)
+        if state.white_turn:
+            k += self.tempo
+        else:
+            k -= self.tempo
+        if k > 99.0:
+            k = 99.0
+        elif k < -99.0:
+            k = -99.0
+        return k if player == "white" else -k
+
 
 # TODO: implement more and better evaluation functions
 
@@ -204,6 +187,7 @@ class MiniMax(SearchAlgorithm):
 
     def __init__(self, evaluation):
         super().__init__(evaluation)
+        self.search_info = {}
 
 
     def init_evaluation(self, env, play_clock):
@@ -215,39 +199,43 @@ class MiniMax(SearchAlgorithm):
     def minimax_search(self, game, state, depth):
         #player = state.white_turn
         value, move = self.max_value(game, state, depth)
-        print("VALUE: ", value)
+        self.search_info = {"move": move, "score": value, "depth": depth}
         return move
 
     def max_value(self, game, state, depth):
-        game_over, winner = game.is_terminal(state)    
-        if game_over:
-            return super().get_eval(state, self.player, winner), None
         if depth == 0:
+            # leaves only need to know if the game is over, not the moves
+            game_over, winner = game.is_terminal(state)
+            return super().get_eval(state, self.player, winner), None
+        game_over, winner, moves = game.get_status(state)
+        if game_over:
             return super().get_eval(state, self.player, winner), None
         v, move = float('-inf'), float('-inf')
         self.n_expansions += 1
-        for a in game.get_legal_moves(state):
-            game.move(state, a)
+        for a in moves:
+            undo = game.move(state, a)
             v2, a2 = self.min_value(game, game.current_state, depth-1)
             if v2 > v:
                 v, move = v2, a
-            game.undo_move(game.current_state, a)
+            game.undo_move(game.current_state, undo)
         return v, move
     
     def min_value(self, game, state, depth):
-        game_over, winner = game.is_terminal(state)    
-        if game_over:
-            return super().get_eval(state, self.player, winner), None
         if depth == 0:
+            # leaves only need to know if the game is over, not the moves
+            game_over, winner = game.is_terminal(state)
+            return super().get_eval(state, self.player, winner), None
+        game_over, winner, moves = game.get_status(state)
+        if game_over:
             return super().get_eval(state, self.player, winner), None
         v, move = float('+inf'), float('+inf')
         self.n_expansions += 1
-        for a in game.get_legal_moves(state):
-            game.move(state, a)
+        for a in moves:
+            undo = game.move(state, a)
             v2, a2 = self.max_value(game, game.current_state, depth-1)
             if v2 < v:
                 v, move = v2, a
-            game.undo_move(game.current_state, a)
+            game.undo_move(game.current_state, undo)
         return v, move
 
     def do_search(self, env, player, depth):
@@ -261,6 +249,7 @@ class AlphaBeta(SearchAlgorithm):
 
     def __init__(self, evaluation):
         super().__init__(evaluation)
+        self.search_info = {}
 
     def init_evaluation(self, env, play_clock):
         self.evaluations.init(env)
@@ -270,45 +259,49 @@ class AlphaBeta(SearchAlgorithm):
     
     def alphabeta_search(self, game, state, depth):
         value, move = self.max_value(game, state, depth, float('-inf'), float('+inf'))
-        print("VALUE: ", value)
+        self.search_info = {"move": move, "score": value, "depth": depth}
         return move
 
     def max_value(self, game, state, depth, alpha, beta):
-        game_over, winner = game.is_terminal(state)    
-        if game_over:
-            return super().get_eval(state, self.player, winner), None
         if depth == 0:
+            # leaves only need to know if the game is over, not the moves
+            game_over, winner = game.is_terminal(state)
+            return super().get_eval(state, self.player, winner), None
+        game_over, winner, moves = game.get_status(state)
+        if game_over:
             return super().get_eval(state, self.player, winner), None
         v = float('-inf')
         move = None
         self.n_expansions += 1
-        for a in game.get_legal_moves(state):
-            game.move(state, a)
+        for a in moves:
+            undo = game.move(state, a)
             v2, a2 = self.min_value(game, game.current_state, depth-1, alpha, beta)
             if v2 > v:
                 v, move = v2, a
                 alpha = max(alpha, v)
-            game.undo_move(game.current_state, a)
+            game.undo_move(game.current_state, undo)
             if v >= beta:
                 return v, move
         return v, move
     
     def min_value(self, game, state, depth, alpha, beta):
-        game_over, winner = game.is_terminal(state)    
-        if game_over:
-            return super().get_eval(state, self.player, winner), None
         if depth == 0:
+            # leaves only need to know if the game is over, not the moves
+            game_over, winner = game.is_terminal(state)
+            return super().get_eval(state, self.player, winner), None
+        game_over, winner, moves = game.get_status(state)
+        if game_over:
             return super().get_eval(state, self.player, winner), None
         v = float('+inf')
         move = None
         self.n_expansions += 1
-        for a in game.get_legal_moves(state):
-            game.move(state, a)
+        for a in moves:
+            undo = game.move(state, a)
             v2, a2 = self.max_value(game, game.current_state, depth-1, alpha, beta)
             if v2 < v:
                 v, move = v2, a
                 beta = min(beta, v)
-            game.undo_move(game.current_state, a)
+            game.undo_move(game.current_state, undo)
             if v <= alpha:
                 return v, move
         return v, move
@@ -324,6 +317,7 @@ class AlphaBeta_iterative_deepening(SearchAlgorithm):
 
     def __init__(self, evaluation):
         super().__init__(evaluation)
+        self.search_info = {}
 
     def init_evaluation(self, env, play_clock):
         self.evaluations.init(env)
@@ -335,65 +329,80 @@ class AlphaBeta_iterative_deepening(SearchAlgorithm):
         move_order = [[] for i in range(depth)]
         for i in range(1, depth+1):
             value, move = self.max_value(game, state, i, float('-inf'), float('+inf'), move_order, 0)
-            print("move: ", move)
-            print("VALUE: ", value)
+            self.search_info = {"move": move, "score": value, "depth": i}
             if value == 100:
                 return move
         return move
 
     def max_value(self, game, state, depth, alpha, beta, move_order, move_order_index):
-        game_over, winner = game.is_terminal(state)    
-        if game_over:
-            return super().get_eval(state, self.player, winner), None
         if depth == 0:
+            # leaves only need to know if the game is over, not the moves
+            game_over, winner = game.is_terminal(state)
+            return super().get_eval(state, self.player, winner), None
+        game_over, winner, moves = game.get_status(state)
+        if game_over:
             return super().get_eval(state, self.player, winner), None
         v = float('-inf')
         if move_order[move_order_index] == []:
-            move_order[move_order_index] = game.get_legal_moves(state)
+            move_order[move_order_index] = moves
         """ print("INSIDE MAX")
         print("move_order[", move_order_index, "]: ", move_order[move_order_index])
         print("depth: ", depth)
         print() """
         self.n_expansions += 1
-        for a in move_order[move_order_index]:
-            game.move(state, a)
+        # the order is kept per ply and shared by every position at that ply, so only its moves that are legal here
+        # are searched (in that order), followed by the legal moves it does not have yet
+        legal = set(moves)
+        ordered = [a for a in move_order[move_order_index] if a in legal]
+        ordered += [a for a in moves if a not in set(ordered)]
+        for a in ordered:
+            undo = game.move(state, a)
             v2, a2 = self.min_value(game, game.current_state, depth-1, alpha, beta, move_order, move_order_index+1)
             if v2 > v:
                 v, move = v2, a
                 alpha = max(alpha, v)
                 # move a in move_order[move_order_index] to the back
-                move_order[move_order_index].remove(a)	
+                if a in move_order[move_order_index]:
+                    move_order[move_order_index].remove(a)
                 move_order[move_order_index].append(a)
                 
-            game.undo_move(game.current_state, a)
+            game.undo_move(game.current_state, undo)
             if v >= beta:
                 return v, move
         return v, move
     
     def min_value(self, game, state, depth, alpha, beta, move_order, move_order_index):
-        game_over, winner = game.is_terminal(state)    
-        if game_over:
-            return super().get_eval(state, self.player, winner), None
         if depth == 0:
+            # leaves only need to know if the game is over, not the moves
+            game_over, winner = game.is_terminal(state)
+            return super().get_eval(state, self.player, winner), None
+        game_over, winner, moves = game.get_status(state)
+        if game_over:
             return super().get_eval(state, self.player, winner), None
         v = float('+inf')
         if move_order[move_order_index] == []:
-            move_order[move_order_index] = game.get_legal_moves(state)
+            move_order[move_order_index] = moves
         """ print("INSIDE MIN")
         print("move_order[", move_order_index, "]: ", move_order[move_order_index])
         print("depth: ", depth)
         print() """
         self.n_expansions += 1
-        for a in move_order[move_order_index]:
-            game.move(state, a)
+        # the order is kept per ply and shared by every position at that ply, so only its moves that are legal here
+        # are searched (in that order), followed by the legal moves it does not have yet
+        legal = set(moves)
+        ordered = [a for a in move_order[move_order_index] if a in legal]
+        ordered += [a for a in moves if a not in set(ordered)]
+        for a in ordered:
+            undo = game.move(state, a)
             v2, a2 = self.max_value(game, game.current_state, depth-1, alpha, beta, move_order, move_order_index+1)
             if v2 < v:
                 v, move = v2, a
                 beta = min(beta, v)
                 # move a in move_order[move_order_index] to the front
-                move_order[move_order_index].remove(a)	
+                if a in move_order[move_order_index]:
+                    move_order[move_order_index].remove(a)
                 move_order[move_order_index].insert(0, a)	
-            game.undo_move(game.current_state, a)
+            game.undo_move(game.current_state, undo)
             if v <= alpha:
                 return v, move
         return v, move
@@ -406,86 +415,392 @@ class AlphaBeta_iterative_deepening(SearchAlgorithm):
     def get_nb_state_expansions(self):
         return self.n_expansions
 
+# null-move pruning is verified with a real search when the player to move has at most this many moves,
+# with few moves left having to move can be worse than passing (zugzwang) and the null move would be too optimistic
+NULL_MOVE_VERIFY_MOVES = 6
+# late move reductions: moves from this index on are searched LMR_REDUCTION plies less first, at depth LMR_MIN_DEPTH
+# or more, the reduction is even so the reduced search ends with the same player to move as the full one
+# (the evaluations differ a lot between odd and even depths and a reduction by one ply is re-searched most of the time)
+LMR_FIRST_MOVE = 3
+LMR_REDUCTION = 2
+LMR_MIN_DEPTH = 4
+
 class AlphaBeta_iterative_deepening_new(SearchAlgorithm):
 
-    def __init__(self, evaluation):
+    # pvs: search every move after the first with a null window (principal variation search)
+    # and only re-search it with the full window if it turns out to be better
+    # aspiration: if > 0, every iteration after the first starts with the window
+    # (previous value - aspiration, previous value + aspiration) and is re-searched with the full window if the value falls outside it
+    # clock: SearchClock that decides when to stop, the default one polls the time every 256 nodes
+    # quiescence: at depth 0 keep searching captures until the position is quiet instead of evaluating right away
+    # null_move: if > 0, let the player to move pass and search the position null_move + 1 plies less deep,
+    # if that is already good enough for a cutoff the real moves are not searched (null-move pruning)
+    # lmr: search quiet moves late in the move order LMR_REDUCTION plies less deep with a null window first,
+    # and only search them to full depth if they turn out better than the best move so far (late move reductions)
+    def __init__(self, evaluation, tt_size=1 << 18, pvs=False, aspiration=0, clock=None, quiescence=False,
+                 null_move=0, lmr=False):
         super().__init__(evaluation)
+        self.tt = TranspositionTable(tt_size)
+        self.ordering = MoveOrdering()
+        self.pvs = pvs
+        self.aspiration = aspiration
+        self.quiescence = quiescence
+        self.null_move = null_move
+        self.lmr = lmr
+        self.clock = clock if clock is not None else SearchClock()
+        self.n_nodes = 0
+        self.depth_reached = 0
+        self.search_info = {}
+        # tablebase.Tablebase with the exact values of positions with few pieces, set by MyAgent.start() when
+        # there is one for the board size, every state below the root that has few enough pieces is looked up in it
+        self.tablebase = None
+        # (value, move) of the best root move of the running iteration, kept when the iteration is cut off
+        self.root_best = None
 
     def init_evaluation(self, env, play_clock):
         self.evaluations.init(env)
         self.n_expansions = 0
         self.play_clock = play_clock
+        # scores in the table are from self.player's point of view, so every game starts with an empty table
+        self.tt.clear()
+        self.ordering.clear()
         return
     
+    # returns the best move of the last iteration that was completed
+    # the statistics of the search are left in self.search_info, a dict of plain values for telemetry.Telemetry
     def alphabeta_search_iterative_deepening(self, game, state, depth):
-        # this copy is only for the TimeoutError
-        # that is, if the time limit is reached, then we dont have to undo all the moves
-        # to get back to the original state
-        game_copy = copy.deepcopy(game)
-        try:
-            for i in range(1, depth+1):
-                t_start_iteration = time.time()
-                value, move = self.max_value(game_copy, game_copy.current_state, i, float('-inf'), float('+inf'))
-                t_end_iteration= time.time()
-                print(f"search time: {t_end_iteration-t_start_iteration} seconds for depth {i}")
-                print("move: ", move)
-                print("VALUE: ", value)
-                if value == 100:
-                    return move
-        except TimeoutError:
-            print("TIMEOUT")
-            print("best move yet: ", move)
-            return move
-        return move
-
-    def max_value(self, game, state, depth, alpha, beta):
-        if time.time() - self.t_start > self.play_clock-0.05:
-            print(time.time() - self.t_start)
-            raise TimeoutError
-        game_over, winner = game.is_terminal(state)    
-        if game_over:
-            return super().get_eval(state, self.player, winner), None
+        # the search works on the real state, every move is undone in a finally block
+        # so the state is back to the root position even when SearchTimeout is raised
+        self.tt.new_search()
+        self.ordering.new_search()
+        tt_probes_start, tt_hits_start, nodes_start = self.tt.n_probes, self.tt.n_hits, self.n_nodes
+        self.n_null_cutoffs, self.n_null_verify_fails, self.n_reductions, self.n_reduction_researches = 0, 0, 0, 0
+        # the root is a min node when the opponent is to move (when pondering)
+        maximizing = state.white_turn == (self.player == "white")
+        root_value = self.max_value if maximizing else self.min_value
+        best_move, value, best_value = None, None, None
+        self.depth_reached = 0
+        nodes_per_iteration, times_per_iteration = [], []
+        stop_reason, n_aspiration_researches = "depth", 0
+        partial_iteration = False
+        for i in range(1, depth+1):
+            # every iteration runs until the clock runs out, the time left of the play clock is lost anyway,
+            # and an iteration that was cut off still has a result once its first root move is searched
+            # (predicting the time of the next iteration from the branching factor stopped most searches far too early)
+            self.root_best = None
+            nodes_start_iteration = self.n_nodes
+            t_start_iteration = time.time()
+            try:
+                if self.aspiration and i > 1:
+                    alpha, beta = value - self.aspiration, value + self.aspiration
+                    value, move = root_value(game, state, i, alpha, beta)
+                    if value <= alpha or value >= beta:
+                        n_aspiration_researches += 1
+                        value, move = root_value(game, state, i, float('-inf'), float('+inf'))
+                else:
+                    value, move = root_value(game, state, i, float('-inf'), float('+inf'))
+            except SearchTimeout:
+                stop_reason = "timeout"
+                if self.root_best is not None:
+                    # the first root move (the best move of the last iteration) was searched to depth i,
+                    # the best root move searched so far is at least as good and was searched deeper
+                    best_value, best_move = self.root_best
+                    partial_iteration = True
+                break
+            times_per_iteration.append(time.time() - t_start_iteration)
+            nodes_per_iteration.append(self.n_nodes - nodes_start_iteration)
+            best_move, best_value = move, value
+            self.depth_reached = i
+            if value == (100 if maximizing else -100):
+                stop_reason = "decided"
+                break
+        if best_move is None:
+            # not even depth 1 finished, any legal move is better than none
+            best_move = game.get_legal_moves(state)[0]
+        self.search_info = {
+            "move": best_move,
+            "score": best_value,
+            "depth": self.depth_reached,
+            "stop_reason": stop_reason,
+            # the move comes from the iteration after depth, which was cut off by the clock
+            "partial_iteration": partial_iteration,
+            "nodes": self.n_nodes - nodes_start,
+            "iteration_nodes": nodes_per_iteration,
+            "iteration_times": [round(t, 6) for t in times_per_iteration],
+            # growth of the tree from the second to last to the last iteration
+            "ebf": nodes_per_iteration[-1] / max(nodes_per_iteration[-2], 1) if len(nodes_per_iteration) >= 2 else None,
+            "cutoffs": self.ordering.n_cutoffs,
+            "first_move_cutoff_rate": self.ordering.first_move_cutoff_rate(),
+            "tt_probes": self.tt.n_probes - tt_probes_start,
+            "tt_hits": self.tt.n_hits - tt_hits_start,
+            "aspiration_researches": n_aspiration_researches,
+            "null_move_cutoffs": self.n_null_cutoffs,
+            "null_move_verify_fails": self.n_null_verify_fails,
+            "reductions": self.n_reductions,
+            "reduction_researches": self.n_reduction_researches,
+        }
+        return best_move
+
+    # looks the state up in the transposition table and returns (score, tt_move, alpha, beta)
+    # score is not None if the stored entry alone decides the value of the state,
+    # otherwise alpha and beta are narrowed by the stored bound and tt_move is the best move stored (or None)
+    # at the root (ply 0) the entry is only used for tt_move, the root has to search its moves to find the
+    # move to play, and a window narrowed by an old bound would make the values of the root moves wrong
+    def probe_tt(self, state, depth, alpha, beta, ply):
+        entry = self.tt.probe(state.hash)
+        if entry is None:
+            return None, None, alpha, beta
+        tt_move = entry[4]
+        if ply > 0 and entry[1] >= depth:
+            flag, score = entry[2], entry[3]
+            if flag == EXACT:
+                return score, tt_move, alpha, beta
+            if flag == LOWER:
+                alpha = max(alpha, score)
+            else:
+                beta = min(beta, score)
+            if alpha >= beta:
+                return score, tt_move, alpha, beta
+        return None, tt_move, alpha, beta
+
+    # the value of the state if it is in the tablebase, otherwise None
+    # a won or lost position gets the same score as a finished game, draws score 0
+    def probe_tablebase(self, state):
+        value = self.tablebase.probe(state)
+        if value == UNKNOWN:
+            return None
+        result, plies = decode(value)
+        if result == "draw":
+            return super().get_eval(state, self.player, 0)
+        side_to_move, other_side = (WHITE, BLACK) if state.white_turn else (BLACK, WHITE)
+        return super().get_eval(state, self.player, side_to_move if result == "win" else other_side)
+
+    # late move reductions only for quiet moves that don't take a piece to the last three rows,
+    # captures and moves that threaten to reach the last row next are searched to full depth
+    def can_reduce(self, game, move, white_turn):
+        if game.was_diagonal_move(move):
+            return False
+        if white_turn:
+            return move[3] < game.height - 3
+        return move[3] > 2
+
+    # null_ok is False right after a null move and in the verification search, so there are never two in a row
+    def max_value(self, game, state, depth, alpha, beta, ply=0, null_ok=True):
+        self.n_nodes += 1
+        if not self.n_nodes & self.clock.check_mask:
+            self.clock.check()
+        if self.tablebase is not None and ply > 0:
+            score = self.probe_tablebase(state)
+            if score is not None:
+                return score, None
         if depth == 0:
+            if self.quiescence:
+                return self.quiescence_max(game, state, alpha, beta), None
+            # leaves only need to know if the game is over, not the moves
+            game_over, winner = game.is_terminal(state)
+            return super().get_eval(state, self.player, winner), None
+        score, tt_move, alpha, beta = self.probe_tt(state, depth, alpha, beta, ply)
+        if score is not None:
+            return score, tt_move
+        game_over, winner, moves = game.get_status(state)
+        if game_over:
             return super().get_eval(state, self.player, winner), None
+        if self.null_move and null_ok and ply > 0 and depth > self.null_move and beta < float('inf'):
+            undo = game.null_move(state)
+            try:
+                v2, a2 = self.min_value(game, state, depth-1-self.null_move, beta-1, beta, ply+1, False)
+            finally:
+                game.undo_null_move(state, undo)
+            # a win found after passing is not a proven win, those positions are searched normally
+            if beta <= v2 < 100:
+                if len(moves) > NULL_MOVE_VERIFY_MOVES:
+                    self.n_null_cutoffs += 1
+                    return v2, None
+                v2, a2 = self.max_value(game, state, depth-self.null_move, alpha, beta, ply, False)
+                if v2 >= beta:
+                    self.n_null_cutoffs += 1
+                    return v2, a2
+                self.n_null_verify_fails += 1
+        alpha_start = alpha
         v = float('-inf')
         self.n_expansions += 1
-        for a in game.get_legal_moves(state):
-            game.move(state, a)
-            v2, a2 = self.min_value(game, game.current_state, depth-1, alpha, beta)
+        for i, a in enumerate(self.ordering.order(moves, ply, tt_move)):
+            reduce = self.lmr and i >= LMR_FIRST_MOVE and depth >= LMR_MIN_DEPTH and \
+                self.can_reduce(game, a, state.white_turn)
+            undo = game.move(state, a)
+            try:
+                if reduce:
+                    self.n_reductions += 1
+                    v2, a2 = self.min_value(game, state, depth-1-LMR_REDUCTION, alpha, alpha+1, ply+1)
+                    if v2 > alpha:
+                        self.n_reduction_researches += 1
+                if reduce and v2 <= alpha:
+                    pass
+                elif self.pvs and i > 0:
+                    v2, a2 = self.min_value(game, state, depth-1, alpha, alpha+1, ply+1)
+                    if alpha < v2 < beta:
+                        v2, a2 = self.min_value(game, state, depth-1, alpha, beta, ply+1)
+                else:
+                    v2, a2 = self.min_value(game, state, depth-1, alpha, beta, ply+1)
+            finally:
+                game.undo_move(state, undo)
             if v2 > v:
                 v, move = v2, a
-                alpha = max(alpha, v)           
-            game.undo_move(game.current_state, a)
+                alpha = max(alpha, v)
+                if ply == 0 and v > alpha_start:
+                    # the value is exact or a lower bound, never an upper bound of a move that failed low
+                    self.root_best = (v, move)
             if v >= beta:
-                return v, move
+                self.ordering.record_cutoff(a, ply, depth, i)
+                break
+        if v >= beta:
+            self.tt.store(state.hash, depth, LOWER, v, move)
+        elif v <= alpha_start:
+            self.tt.store(state.hash, depth, UPPER, v, move)
+        else:
+            self.tt.store(state.hash, depth, EXACT, v, move)
         return v, move
     
-    def min_value(self, game, state, depth, alpha, beta):
-        if time.time() - self.t_start > self.play_clock-0.05:
-            print(time.time() - self.t_start)
-            raise TimeoutError
-        game_over, winner = game.is_terminal(state)    
-        if game_over:
-            return super().get_eval(state, self.player, winner), None
+    def min_value(self, game, state, depth, alpha, beta, ply=0, null_ok=True):
+        self.n_nodes += 1
+        if not self.n_nodes & self.clock.check_mask:
+            self.clock.check()
+        if self.tablebase is not None and ply > 0:
+            score = self.probe_tablebase(state)
+            if score is not None:
+                return score, None
         if depth == 0:
+            if self.quiescence:
+                return self.quiescence_min(game, state, alpha, beta), None
+            # leaves only need to know if the game is over, not the moves
+            game_over, winner = game.is_terminal(state)
             return super().get_eval(state, self.player, winner), None
+        score, tt_move, alpha, beta = self.probe_tt(state, depth, alpha, beta, ply)
+        if score is not None:
+            return score, tt_move
+        game_over, winner, moves = game.get_status(state)
+        if game_over:
+            return super().get_eval(state, self.player, winner), None
+        if self.null_move and null_ok and ply > 0 and depth > self.null_move and alpha > float('-inf'):
+            undo = game.null_move(state)
+            try:
+                v2, a2 = self.max_value(game, state, depth-1-self.null_move, alpha, alpha+1, ply+1, False)
+            finally:
+                game.undo_null_move(state, undo)
+            if -100 < v2 <= alpha:
+                if len(moves) > NULL_MOVE_VERIFY_MOVES:
+                    self.n_null_cutoffs += 1
+                    return v2, None
+                v2, a2 = self.min_value(game, state, depth-self.null_move, alpha, beta, ply, False)
+                if v2 <= alpha:
+                    self.n_null_cutoffs += 1
+                    return v2, a2
+                self.n_null_verify_fails += 1
+        beta_start = beta
         v = float('+inf')
         self.n_expansions += 1
-        for a in game.get_legal_moves(state):
-            game.move(state, a)
-            v2, a2 = self.max_value(game, game.current_state, depth-1, alpha, beta)
+        for i, a in enumerate(self.ordering.order(moves, ply, tt_move)):
+            reduce = self.lmr and i >= LMR_FIRST_MOVE and depth >= LMR_MIN_DEPTH and \
+                self.can_reduce(game, a, state.white_turn)
+            undo = game.move(state, a)
+            try:
+                if reduce:
+                    self.n_reductions += 1
+                    v2, a2 = self.max_value(game, state, depth-1-LMR_REDUCTION, beta-1, beta, ply+1)
+                    if v2 < beta:
+                        self.n_reduction_researches += 1
+                if reduce and v2 >= beta:
+                    pass
+                elif self.pvs and i > 0:
+                    v2, a2 = self.max_value(game, state, depth-1, beta-1, beta, ply+1)
+                    if alpha < v2 < beta:
+                        v2, a2 = self.max_value(game, state, depth-1, alpha, beta, ply+1)
+                else:
+                    v2, a2 = self.max_value(game, state, depth-1, alpha, beta, ply+1)
+            finally:
+                game.undo_move(state, undo)
             if v2 < v:
                 v, move = v2, a
-                beta = min(beta, v)	
-            game.undo_move(game.current_state, a)
+                beta = min(beta, v)
+                if ply == 0 and v < beta_start:
+                    self.root_best = (v, move)
             if v <= alpha:
-                return v, move
+                self.ordering.record_cutoff(a, ply, depth, i)
+                break
+        if v <= alpha:
+            self.tt.store(state.hash, depth, UPPER, v, move)
+        elif v >= beta_start:
+            self.tt.store(state.hash, depth, LOWER, v, move)
+        else:
+            self.tt.store(state.hash, depth, EXACT, v, move)
         return v, move
 
+    # quiescence search: only captures are searched and the player to move can always "stand pat",
+    # i.e. take the evaluation of the state instead of capturing, so the value is at least the stand pat value
+    # for max (at most for min) and positions without good captures are cut off right away
+    # the state itself was already counted in n_nodes by max_value/min_value, so only the captures are counted here
+    def quiescence_max(self, game, state, alpha, beta):
+        game_over, winner = game.is_terminal(state)
+        v = super().get_eval(state, self.player, winner)
+        if game_over or v >= beta:
+            return v
+        alpha = max(alpha, v)
+        for a in game.get_capture_moves(state):
+            undo = game.move(state, a)
+            try:
+                self.n_nodes += 1
+                if not self.n_nodes & self.clock.check_mask:
+                    self.clock.check()
+                v2 = self.quiescence_min(game, state, alpha, beta)
+            finally:
+                game.undo_move(state, undo)
+            if v2 > v:
+                v = v2
+                alpha = max(alpha, v)
+            if v >= beta:
+                break
+        return v
+
+    def quiescence_min(self, game, state, alpha, beta):
+        game_over, winner = game.is_terminal(state)
+        v = super().get_eval(state, self.player, winner)
+        if game_over or v <= alpha:
+            return v
+        beta = min(beta, v)
+        for a in game.get_capture_moves(state):
+            undo = game.move(state, a)
+            try:
+                self.n_nodes += 1
+                if not self.n_nodes & self.clock.check_mask:
+                    self.clock.check()
+                v2 = self.quiescence_max(game, state, alpha, beta)
+            finally:
+                game.undo_move(state, undo)
+            if v2 < v:
+                v = v2
+                beta = min(beta, v)
+            if v <= alpha:
+                break
+        return v
+
     def do_search(self, env, player, depth):
         self.player = player
-        self.t_start = time.time()
+        self.clock.start(self.play_clock)
+        return self.alphabeta_search_iterative_deepening(env, env.current_state, depth)
+
+    # searches the current state while the opponent is to move, without a time limit until stop_pondering() is called
+    # (meant to run in another thread), returns the move the opponent is expected to make
+    # everything it stores in the transposition table and move ordering tables is used by the next do_search
+    def ponder(self, env, player, depth):
+        self.player = player
         return self.alphabeta_search_iterative_deepening(env, env.current_state, depth)
+
+    def start_pondering(self):
+        self.clock.start(float('inf'))
+
+    # ends ponder() at its next clock check
+    def stop_pondering(self):
+        self.clock.stop()
     
     
     def get_nb_state_expansions(self):
@@ -1,7 +1,13 @@
+from zobrist import zobrist_hash
 
 WHITE, BLACK, EMPTY = "W", "B", " "
 
-class State:  
+# __slots__ instead of an attribute dict: smaller, faster attribute access and cheap to clone()
+# hash is the zobrist hash (fixed seed), the same in every process and run, unlike hash() of a str or tuple
+class State:
+    __slots__ = ("board", "white_turn", "width", "height", "white_rows", "black_rows", "white_count", "black_count",
+                 "white_advance", "black_advance", "attacks", "hash")
+
     def __init__(self, width, height) -> None:
         self.board = [[WHITE]*width if i < 2 else
                       [BLACK]*width if i > height-3 else
@@ -10,6 +16,60 @@ class State:
         self.white_turn = True
         self.width = width
         self.height = height
+        self.compute_features()
+
+    # computes everything the Environment keeps up to date incrementally in move/undo_move from the board,
+    # needs to be called again if the board is changed in any other way
+    def compute_features(self):
+        # number of white/black pieces on each row, the win check is just white_rows[-1] / black_rows[0]
+        self.white_rows = [row.count(WHITE) for row in self.board]
+        self.black_rows = [row.count(BLACK) for row in self.board]
+        self.white_count = sum(self.white_rows)
+        self.black_count = sum(self.black_rows)
+        # how far the most advanced piece of each side has come (row of the most advanced white piece,
+        # rows from the top for black), 0 if the side has no pieces left
+        self.white_advance = 0
+        for y in range(self.height - 1, -1, -1):
+            if self.white_rows[y]:
+                self.white_advance = y
+                break
+        self.black_advance = 0
+        for y in range(self.height):
+            if self.black_rows[y]:
+                self.black_advance = self.height - 1 - y
+                break
+        # number of white pieces with a black piece diagonally in front of them (counted once per pair),
+        # every such pair is a capture for whichever player is to move, so both players have this many captures
+        self.attacks = 0
+        for y in range(self.height - 1):
+            for x in range(self.width):
+                if self.board[y][x] == WHITE:
+                    if x > 0 and self.board[y + 1][x - 1] == BLACK:
+                        self.attacks += 1
+                    if x < self.width - 1 and self.board[y + 1][x + 1] == BLACK:
+                        self.attacks += 1
+        # zobrist hash of the position (pieces and player to move)
+        self.hash = zobrist_hash(self.board, self.white_turn, self.width, self.height)
+
+
+    # copy of the state that shares nothing mutable with it, much cheaper than copy.deepcopy
+    # (the rows are copied, the features and the hash are taken over instead of computed again)
+    def clone(self):
+        state = State.__new__(State)
+        state.board = [row[:] for row in self.board]
+        state.white_rows = self.white_rows[:]
+        state.black_rows = self.black_rows[:]
+        state.white_turn, state.width, state.height = self.white_turn, self.width, self.height
+        state.white_count, state.black_count = self.white_count, self.black_count
+        state.white_advance, state.black_advance = self.white_advance, self.black_advance
+        state.attacks, state.hash = self.attacks, self.hash
+        return state
+
+    # sets up any position, board is a list of lists like self.board (copied)
+    def set_board(self, board, white_turn):
+        self.board = [list(row) for row in board]
+        self.white_turn = white_turn
+        self.compute_features()
         
     def __str__(self) -> str:
         dash_count = self.width*4 - 3
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+"""
+Builds an endgame tablebase for Knightthrough: the exact result (win/loss/draw and the number of plies
+until the game ends) of every position with at most max_pieces pieces on the board.
+Usage: tablebase.py width height max_pieces [file]
+Example: tablebase.py 5 5 4
+the default file is tablebases/knightthrough_<width>x<height>.tb, which MyAgent.start() loads if it exists
+"""
+
+import mmap
+import os
+import struct
+import sys
+import time
+
+from bitboard import BitboardEnvironment, BitboardState
+
+WHITE, BLACK, EMPTY = "W", "B", " "
+
+TABLEBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebases")
+MAGIC = b"KTTB"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBB") # magic, version, width, height, max_pieces
+
+# one byte per position, always from the point of view of the player to move
+# 0 = not solved (or not a position: white and black on the same square), 1 = draw,
+# 2 + 2*n = win in n plies, 3 + 2*n = loss in n plies (the game is over after n more moves)
+UNKNOWN, DRAW = 0, 1
+
+def win_in(n):
+    return 2 + 2*n
+
+def loss_in(n):
+    return 3 + 2*n
+
+# returns ("win"/"loss"/"draw", plies) for a stored byte
+def decode(value):
+    if value == DRAW:
+        return "draw", 0
+    if value % 2 == 0:
+        return "win", (value - 2) // 2
+    return "loss", (value - 3) // 2
+
+def tablebase_path(width, height):
+    return os.path.join(TABLEBASE_DIR, f"knightthrough_{width}x{height}.tb")
+
+# every (n_white, n_black) material signature in the tablebase, in the order the tables are stored
+def signatures(max_pieces):
+    return [(n_white, total - n_white) for total in range(1, max_pieces + 1) for n_white in range(total, -1, -1)]
+
+def binomials(n, k):
+    table = [[0]*(k + 1) for i in range(n + 1)]
+    for i in range(n + 1):
+        table[i][0] = 1
+        for j in range(1, min(i, k) + 1):
+            table[i][j] = table[i-1][j-1] + (table[i-1][j] if j <= i - 1 else 0)
+    return table
+
+# square numbers (y*width + x) of the set bits, lowest first
+def squares(bits):
+    result = []
+    while bits:
+        bit = bits & -bits
+        result.append(bit.bit_length() - 1)
+        bits ^= bit
+    return result
+
+
+# the layout of the tables, shared by the builder and the reader
+class TablebaseLayout:
+    def __init__(self, width, height, max_pieces):
+        self.width = width
+        self.height = height
+        self.max_pieces = max_pieces
+        self.n_squares = width*height
+        self.binomial = binomials(self.n_squares, max_pieces)
+        # offset of the table of every signature and the size of the whole file
+        self.offsets = {}
+        offset = HEADER.size
+        for n_white, n_black in signatures(max_pieces):
+            self.offsets[(n_white, n_black)] = offset
+            offset += self.binomial[self.n_squares][n_white] * self.binomial[self.n_squares][n_black] * 2
+        self.size = offset
+
+    # rank of a sorted list of squares among all sets of the same size (combinatorial number system)
+    def rank(self, piece_squares):
+        binomial = self.binomial
+        return sum(binomial[square][i + 1] for i, square in enumerate(piece_squares))
+
+    # position of a state in the file, white and black are bitboards
+    def index(self, white, black, white_turn):
+        white_squares, black_squares = squares(white), squares(black)
+        n_black = len(black_squares)
+        offset = self.offsets[(len(white_squares), n_black)]
+        combined = self.rank(white_squares) * self.binomial[self.n_squares][n_black] + self.rank(black_squares)
+        return offset + 2*combined + white_turn
+
+
+# reads a tablebase file through mmap, so only the pages that are actually probed are loaded
+class Tablebase:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, width, height, max_pieces = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise RuntimeError("not a knightthrough tablebase: " + path)
+        self.layout = TablebaseLayout(width, height, max_pieces)
+        if len(self.data) != self.layout.size:
+            raise RuntimeError("tablebase file has the wrong size: " + path)
+        self.width = width
+        self.height = height
+        self.max_pieces = max_pieces
+        self.n_probes = 0
+        self.n_hits = 0
+
+    # opens the tablebase of the board size if there is one, otherwise returns None
+    @staticmethod
+    def load(width, height):
+        path = tablebase_path(width, height)
+        if not os.path.exists(path):
+            return None
+        return Tablebase(path)
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    # returns the stored byte for the state (see decode()) or UNKNOWN if the state has too many pieces,
+    # works with State and BitboardState
+    def probe(self, state):
+        if state.white_count + state.black_count > self.max_pieces:
+            return UNKNOWN
+        self.n_probes += 1
+        if isinstance(state, BitboardState):
+            white, black = state.white, state.black
+        else:
+            white, black = 0, 0
+            bit = 1
+            for row in state.board:
+                for cell in row:
+                    if cell == WHITE:
+                        white |= bit
+                    elif cell == BLACK:
+                        black |= bit
+                    bit <<= 1
+        value = self.data[self.layout.index(white, black, state.white_turn)]
+        if value != UNKNOWN:
+            self.n_hits += 1
+        return value
+
+
+# solves every position with up to max_pieces pieces, working back from the positions where the game is over:
+# the value of a position is only known once the values of all the positions after its moves are known
+# (the game can't repeat positions since every move goes forward, so this always ends)
+class TablebaseBuilder:
+    def __init__(self, width, height, max_pieces):
+        self.layout = TablebaseLayout(width, height, max_pieces)
+        self.env = BitboardEnvironment(width, height)
+        self.table = bytearray(self.layout.size)
+        HEADER.pack_into(self.table, 0, MAGIC, VERSION, width, height, max_pieces)
+
+    def solve(self, state):
+        index = self.layout.index(state.white, state.black, state.white_turn)
+        if self.table[index] != UNKNOWN:
+            return self.table[index]
+        game_over, winner, moves = self.env.get_status(state)
+        if game_over:
+            if winner == 0:
+                value = DRAW
+            elif (winner == WHITE) == state.white_turn:
+                value = win_in(0)
+            else:
+                value = loss_in(0)
+        else:
+            fastest_win, slowest_loss, draw = None, None, False
+            for move in moves:
+                undo = self.env.move(state, move)
+                result, plies = decode(self.solve(state))
+                self.env.undo_move(state, undo)
+                # result is from the opponent's point of view
+                if result == "loss":
+                    if fastest_win is None or plies + 1 < fastest_win:
+                        fastest_win = plies + 1
+                elif result == "draw":
+                    draw = True
+                elif slowest_loss is None or plies + 1 > slowest_loss:
+                    slowest_loss = plies + 1
+            if fastest_win is not None:
+                value = win_in(fastest_win)
+            elif draw:
+                value = DRAW
+            else:
+                value = loss_in(slowest_loss)
+        self.table[index] = value
+        return value
+
+    # all placements of n pieces on the board, as bitboards
+    def placements(self, n, start=0):
+        if n == 0:
+            yield 0
+            return
+        for square in range(start, self.layout.n_squares - n + 1):
+            for rest in self.placements(n - 1, square + 1):
+                yield (1 << square) | rest
+
+    def build(self):
+        state = self.env.current_state
+        n_positions = 0
+        for n_white, n_black in signatures(self.layout.max_pieces):
+            t_start = time.time()
+            for white in self.placements(n_white):
+                for black in self.placements(n_black):
+                    if white & black:
+                        continue
+                    for white_turn in (False, True):
+                        state.white, state.black, state.white_turn = white, black, white_turn
+                        state.hash = 0 # not needed for solving
+                        self.solve(state)
+                        n_positions += 1
+            print(f"{n_white} white, {n_black} black: {time.time() - t_start:.1f} s")
+        print(f"{n_positions} positions")
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(self.table)
+
+
+def main():
+    if len(sys.argv) not in (4, 5):
+        sys.exit(globals()['__doc__'].strip())
+    width, height, max_pieces = (int(arg) for arg in sys.argv[1:4])
+    path = sys.argv[4] if len(sys.argv) == 5 else tablebase_path(width, height)
+    sys.setrecursionlimit(10000)
+    builder = TablebaseBuilder(width, height, max_pieces)
+    builder.build()
+    builder.write(path)
+    print(f"wrote {builder.layout.size} bytes to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import json
+import sys
+import threading
+import time
+
+
+# writes one JSON object per line to a sink, e.g. one record per move with the statistics of the search
+# the agents and searchers only build a record if they have a Telemetry, so without one it costs nothing
+class Telemetry:
+
+    # sink: file name (the records are appended), "-" for stdout or any object with write() and flush()
+    # fields: added to every record, e.g. a match id
+    def __init__(self, sink, **fields):
+        if sink == "-":
+            self.file = sys.stdout
+            self.owns_file = False
+        elif isinstance(sink, str):
+            self.file = open(sink, "a")
+            self.owns_file = True
+        else:
+            self.file = sink
+            self.owns_file = False
+        self.fields = fields
+        # the pondering thread and the main thread can both write
+        self.lock = threading.Lock()
+
+    def record(self, **values):
+        record = {"time": time.time()}
+        record.update(self.fields)
+        record.update(values)
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self):
+        if self.owns_file:
+            self.file.close()
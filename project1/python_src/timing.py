@@ -0,0 +1,41 @@
+import time
+
+
+# raised by SearchClock.check when the time is up in the middle of an iteration
+class SearchTimeout(Exception):
+    pass
+
+
+# clock for one search, the search calls check() every check_every nodes instead of calling time.time() at every node
+# and can ask can_finish() before starting the next iteration of the iterative deepening
+class SearchClock:
+    # margin is the time (seconds) kept back from the play clock for sending the answer,
+    # check_every must be a power of two so the search can test it with nodes & check_mask
+    def __init__(self, margin=0.05, check_every=256):
+        self.margin = margin
+        self.check_mask = check_every - 1
+        self.t_start = time.time()
+        self.deadline = self.t_start
+
+    def start(self, time_limit):
+        self.t_start = time.time()
+        self.time_limit = time_limit
+        self.deadline = self.t_start + time_limit - self.margin
+
+    # ends the search at the next check(), can be called from another thread
+    def stop(self):
+        self.deadline = 0
+
+    def check(self):
+        if time.time() >= self.deadline:
+            raise SearchTimeout
+
+    def elapsed(self):
+        return time.time() - self.t_start
+
+    def remaining(self):
+        return self.deadline - time.time()
+
+    # True if an iteration that is predicted to take predicted_time seconds can finish before the deadline
+    def can_finish(self, predicted_time):
+        return predicted_time < self.remaining()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+"""
+Plays Knightthrough matches between agents without the game controller, an Environment is the referee.
+Every pair of players plays every opening with both colors on every board size, games run in parallel processes.
+Usage: tournament.py [--players simple v2] [--sizes 5x5 8x8] [--clock 1] [--openings 4] [--processes 8]
+                     [--telemetry file]
+Example: tournament.py --players pvs pvs-quiescence --sizes 6x6 --clock 0.5 --openings 6
+"""
+
+import argparse
+import collections
+import contextlib
+import io
+import itertools
+import multiprocessing
+import os
+import re
+import time
+
+from environment import Environment
+from bitboard import BitboardEnvironment
+from my_agent import MyAgent
+from search import *
+from mcts import MCTS
+from telemetry import Telemetry
+from benchmark import benchmark_positions, board_size
+
+# name -> function that makes a new agent, the agents are made in the worker processes
+PLAYERS = {
+    "simple": lambda: MyAgent(AlphaBeta_iterative_deepening_new(SimpleEvaluation())),
+    "v1": lambda: MyAgent(AlphaBeta_iterative_deepening_new(Evaluation_v1())),
+    "v2": lambda: MyAgent(AlphaBeta_iterative_deepening_new(Evaluation_v2())),
+    "tuned": lambda: MyAgent(AlphaBeta_iterative_deepening_new(TunedEvaluation.load())),
+    "pvs": lambda: MyAgent(AlphaBeta_iterative_deepening_new(SimpleEvaluation(), pvs=True)),
+    "pvs-quiescence": lambda: MyAgent(AlphaBeta_iterative_deepening_new(SimpleEvaluation(), pvs=True, quiescence=True)),
+    "pvs-selective": lambda: MyAgent(AlphaBeta_iterative_deepening_new(SimpleEvaluation(), pvs=True, null_move=2, lmr=True)),
+    "bitboard": lambda: MyAgent(AlphaBeta_iterative_deepening_new(SimpleEvaluation()), BitboardEnvironment),
+    "mcts": lambda: MyAgent(MCTS()),
+    "mcts-cutoff": lambda: MyAgent(MCTS(playout_depth=8)),
+}
+
+MOVE = re.compile(r'\(\s*move\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s*\)', re.IGNORECASE)
+
+# result of one game, per color: number of moves, total seconds, depth reached per move, nodes searched,
+# moves that took longer than the play clock
+GameResult = collections.namedtuple("GameResult", ["white", "black", "width", "height", "winner", "illegal",
+                                                   "moves", "seconds", "depths", "nodes", "late_moves"])
+
+# nodes searched so far by the agent, the visited nodes if the search counts them
+def nodes_searched(agent):
+    search = agent.search_algorithm
+    if hasattr(search, "n_nodes"):
+        return search.n_nodes
+    return search.get_nb_state_expansions()
+
+# task = (game number, white player, black player, width, height, play clock, opening, telemetry file or None)
+# the opening moves (0-indexed) are played for the agents, they still get to think about them
+# but their answers are replaced, so every game starts after the opening
+def play_game(task):
+    game, white_name, black_name, width, height, play_clock, opening, telemetry_file = task
+    agents = {"white": PLAYERS[white_name](), "black": PLAYERS[black_name]()}
+    if telemetry_file is not None:
+        telemetry = Telemetry(telemetry_file, game=game, white=white_name, black=black_name)
+        for agent in agents.values():
+            agent.telemetry = telemetry
+    referee = Environment(width, height)
+    moves = {"white": 0, "black": 0}
+    seconds = {"white": 0.0, "black": 0.0}
+    depths = {"white": [], "black": []}
+    nodes = {"white": 0, "black": 0}
+    late_moves = {"white": 0, "black": 0}
+    winner, illegal = None, None
+    # the agents print every move, none of that is wanted here
+    with contextlib.redirect_stdout(io.StringIO()):
+        for role, agent in agents.items():
+            agent.start(role, width, height, play_clock)
+        last_move = None
+        ply = 0
+        while True:
+            game_over, winner, legal_moves = referee.get_status(referee.current_state)
+            if game_over:
+                break
+            role = "white" if referee.current_state.white_turn else "black"
+            replies = {}
+            for name, agent in agents.items():
+                nodes_start = nodes_searched(agent)
+                t_start = time.time()
+                replies[name] = agent.next_action(last_move)
+                if name == role:
+                    t_move = time.time() - t_start
+                    if ply >= len(opening):
+                        moves[role] += 1
+                        seconds[role] += t_move
+                        nodes[role] += nodes_searched(agent) - nodes_start
+                        depths[role].append(getattr(agent.search_algorithm, "depth_reached", 0))
+                        late_moves[role] += t_move > play_clock
+            if ply < len(opening):
+                move = opening[ply]
+            else:
+                match = MOVE.search(replies[role])
+                move = tuple(int(match.group(i)) - 1 for i in range(1, 5)) if match else None
+                if move not in legal_moves:
+                    # an illegal move (or no move) loses the game
+                    illegal = role
+                    winner = "B" if role == "white" else "W"
+                    break
+            referee.move(referee.current_state, move)
+            last_move = tuple(x + 1 for x in move)
+            ply += 1
+        for agent in agents.values():
+            agent.cleanup(last_move)
+    if telemetry_file is not None:
+        telemetry.close()
+    return GameResult(white_name, black_name, width, height, winner, illegal,
+                      moves, seconds, depths, nodes, late_moves)
+
+# every game of the tournament: all pairs of players, both colors, every opening and board size
+def tournament_tasks(players, sizes, play_clock, n_openings, telemetry_file=None):
+    tasks = []
+    for width, height in sizes:
+        openings = benchmark_positions(width, height, n_openings)
+        for a, b in itertools.combinations(players, 2):
+            for opening in openings:
+                for white, black in ((a, b), (b, a)):
+                    tasks.append((len(tasks), white, black, width, height, play_clock, opening, telemetry_file))
+    return tasks
+
+def print_results(results, players):
+    print(f"{'':20} {'games':>6} {'wins':>5} {'draws':>6} {'losses':>7} {'score':>6} {'avg depth':>10} "
+          f"{'nodes/s':>9} {'late':>5} {'illegal':>8}")
+    for player in players:
+        games, wins, draws, n_depths, sum_depths, nodes, seconds, late, illegal = 0, 0, 0, 0, 0, 0, 0.0, 0, 0
+        for result in results:
+            for role, color in (("white", "W"), ("black", "B")):
+                if getattr(result, role) != player:
+                    continue
+                games += 1
+                wins += result.winner == color
+                draws += result.winner == 0
+                n_depths += len(result.depths[role])
+                sum_depths += sum(result.depths[role])
+                nodes += result.nodes[role]
+                seconds += result.seconds[role]
+                late += result.late_moves[role]
+                illegal += result.illegal == role
+        if not games:
+            continue
+        losses = games - wins - draws
+        score = (wins + 0.5*draws) / games
+        avg_depth = sum_depths / max(n_depths, 1)
+        print(f"{player:20} {games:6} {wins:5} {draws:6} {losses:7} {score:6.1%} {avg_depth:10.2f} "
+              f"{nodes/max(seconds, 1e-9):9.0f} {late:5} {illegal:8}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Knightthrough self-play tournament")
+    parser.add_argument("--players", nargs="+", choices=sorted(PLAYERS), default=["simple", "v2"])
+    parser.add_argument("--sizes", type=board_size, nargs="+", default=[(5, 5), (8, 8)])
+    parser.add_argument("--clock", type=float, default=1, help="play clock in seconds")
+    parser.add_argument("--openings", type=int, default=4,
+                        help="number of start positions (the first one is the real start position)")
+    parser.add_argument("--processes", type=int, default=None, help="number of games played at the same time")
+    parser.add_argument("--telemetry", default=None, help="append the search statistics of every move to this file")
+    args = parser.parse_args()
+    if len(args.players) < 2:
+        parser.error("at least two players are needed")
+
+    tasks = tournament_tasks(args.players, args.sizes, args.clock, args.openings, args.telemetry)
+    print(f"{len(tasks)} games")
+    t_start = time.time()
+    with multiprocessing.Pool(args.processes or os.cpu_count()) as pool:
+        results = pool.map(play_game, tasks, chunksize=1)
+    print(f"played in {time.time() - t_start:.1f} s")
+    for width, height in args.sizes:
+        print(f"\n{width}x{height}, play clock {args.clock} s")
+        print_results([r for r in results if (r.width, r.height) == (width, height)], args.players)
+    if len(args.sizes) > 1:
+        print("\nall sizes")
+        print_results(results, args.players)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# bound types of a stored score
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+# fixed size transposition table indexed by the low bits of the zobrist hash
+# every slot holds one entry (hash, depth, flag, score, best move, generation)
+class TranspositionTable:
+    def __init__(self, size=1 << 18):
+        # size is rounded up to a power of two so the slot is just hash & mask
+        self.size = 1 << (size - 1).bit_length()
+        self.mask = self.size - 1
+        self.clear()
+
+    def clear(self):
+        self.table = [None] * self.size
+        self.generation = 0
+        self.n_probes = 0
+        self.n_hits = 0
+        self.n_stores = 0
+
+    # call once per search, entries from older searches are replaced first
+    def new_search(self):
+        self.generation += 1
+
+    # returns the entry stored for this hash or None
+    def probe(self, key):
+        self.n_probes += 1
+        entry = self.table[key & self.mask]
+        if entry is not None and entry[0] == key:
+            self.n_hits += 1
+            return entry
+        return None
+
+    # depth preferred replacement, but never keep an entry from an older search over a new one
+    def store(self, key, depth, flag, score, move):
+        index = key & self.mask
+        entry = self.table[index]
+        if entry is None or entry[0] == key or entry[5] != self.generation or depth >= entry[1]:
+            self.table[index] = (key, depth, flag, score, move, self.generation)
+            self.n_stores += 1
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+"""
+Texel tuning of the TunedEvaluation weights: fits the weights to the outcome of recorded games by
+logistic regression on quiet positions (positions where the side to move has no capture). Needs numpy.
+Usage: tuner.py selfplay [--sizes 5x5 8x8] [--games 100] [--depth 2] [--random 0.1] [--records file]
+       tuner.py tune [--records file ...] [--iterations 2000] [--weights file]
+Example: tuner.py selfplay --games 200 --records selfplay.jsonl && tuner.py tune --records selfplay.jsonl
+selfplay writes games in the format of game_records.py, tune reads any number of such files
+(by default the kiosk games in logs/game_records.jsonl) and writes the weights TunedEvaluation.load() reads
+"""
+
+import argparse
+import json
+import random
+
+import numpy as np
+
+from environment import Environment
+from search import *
+from batch_eval import batch_features, encode_states
+from benchmark import benchmark_positions, board_size, player_to_move
+from game_records import RECORDS_FILE, pack_moves, unpack_moves, read_records, write_records
+
+# game result from white's point of view
+OUTCOMES = {"W": 1.0, "B": 0.0, 0: 0.5}
+
+
+# plays games between two fixed depth searches with SimpleEvaluation, starting from the benchmark positions,
+# a random move is played instead of the searched one with probability p_random so the games differ
+# returns the games as game records (game_records.py)
+def selfplay_records(sizes, n_games, depth, p_random, seed=0):
+    rng = random.Random(seed)
+    records = []
+    for game in range(n_games):
+        width, height = sizes[game % len(sizes)]
+        env = Environment(width, height)
+        search = AlphaBeta_iterative_deepening_new(SimpleEvaluation())
+        search.init_evaluation(env, float('inf'))
+        moves = list(rng.choice(benchmark_positions(width, height, 8, seed)))
+        for move in moves:
+            env.move(env.current_state, move)
+        while True:
+            game_over, winner, legal_moves = env.get_status(env.current_state)
+            if game_over:
+                break
+            if rng.random() < p_random:
+                move = rng.choice(legal_moves)
+            else:
+                move = tuple(search.do_search(env, player_to_move(env), depth))
+            env.move(env.current_state, move)
+            moves.append(move)
+        records.append({"match": f"selfplay-{seed}-{game}", "width": width, "height": height,
+                        "moves": pack_moves(moves, width, height), "n_moves": len(moves),
+                        "finished": True, "winner": winner})
+    return records
+
+# the quiet positions of the finished games and the game outcome from white's point of view
+# returns (features, outcomes), features is an array (N, 3) in the order of TunedEvaluation.FEATURES
+# the first skip_plies positions of every game are left out, they are the same in many games
+def training_positions(records, skip_plies=2):
+    features, outcomes = [], []
+    for record in records:
+        if record.get("winner") is None:
+            continue
+        width, height = record["width"], record["height"]
+        env = Environment(width, height)
+        states = []
+        for ply, move in enumerate(unpack_moves(record["moves"], width, height)):
+            state = env.current_state
+            if ply >= skip_plies and not env.is_terminal(state)[0] and not env.get_capture_moves(state):
+                states.append(state.clone())
+            env.move(state, move)
+        if not states:
+            continue
+        batch = batch_features(encode_states(states))
+        tempo = np.array([1 if state.white_turn else -1 for state in states])
+        features.append(np.stack([batch.white_advance - batch.black_advance,
+                                  batch.white_count - batch.black_count, tempo], axis=1))
+        outcomes.append(np.full(len(states), OUTCOMES[record["winner"]]))
+    if not features:
+        return np.zeros((0, len(TunedEvaluation.FEATURES))), np.zeros(0)
+    return np.concatenate(features).astype(np.float64), np.concatenate(outcomes)
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+# mean squared error between the outcomes and the win probability sigmoid(k*score) predicted by the weights
+def texel_error(features, outcomes, weights, k):
+    scores = np.clip(features @ weights, -99, 99)
+    return np.mean((outcomes - sigmoid(k*scores))**2)
+
+# k scales the scores to win probabilities, it is fitted once for the starting weights and kept fixed,
+# so the tuned weights stay in the same units as the +-100 of a won or lost game
+def fit_k(features, outcomes, weights):
+    candidates = np.logspace(-3, 1, 200)
+    errors = [texel_error(features, outcomes, weights, k) for k in candidates]
+    return float(candidates[int(np.argmin(errors))])
+
+# gradient descent on the mean squared error, the gradient of all positions is computed at once
+def tune(features, outcomes, weights, k, iterations=2000, learning_rate=None):
+    weights = np.array(weights, dtype=np.float64)
+    if learning_rate is None:
+        # step size for features of about the size of the board
+        learning_rate = 1 / (k*k*max(np.mean(features**2), 1e-9))
+    for i in range(iterations):
+        p = sigmoid(k*(features @ weights))
+        gradient = -2*k*((outcomes - p)*p*(1 - p)) @ features / len(outcomes)
+        weights -= learning_rate*gradient
+    return weights
+
+def main():
+    parser = argparse.ArgumentParser(description="Texel tuning of the evaluation weights")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    selfplay_parser = commands.add_parser("selfplay", help="play games to tune on")
+    selfplay_parser.add_argument("--sizes", type=board_size, nargs="+", default=[(5, 5), (6, 6), (8, 8)])
+    selfplay_parser.add_argument("--games", type=int, default=100)
+    selfplay_parser.add_argument("--depth", type=int, default=2)
+    selfplay_parser.add_argument("--random", type=float, default=0.1, help="probability of a random move")
+    selfplay_parser.add_argument("--seed", type=int, default=0)
+    selfplay_parser.add_argument("--records", required=True)
+
+    tune_parser = commands.add_parser("tune", help="fit the weights to the outcome of the games")
+    tune_parser.add_argument("--records", nargs="+", default=[RECORDS_FILE])
+    tune_parser.add_argument("--iterations", type=int, default=2000)
+    tune_parser.add_argument("--skip-plies", type=int, default=2)
+    tune_parser.add_argument("--weights", default=WEIGHTS_FILE)
+
+    args = parser.parse_args()
+    if args.command == "selfplay":
+        records = selfplay_records(args.sizes, args.games, args.depth, args.random, args.seed)
+        write_records(records, args.records)
+        print(f"wrote {len(records)} games to {args.records}")
+    elif args.command == "tune":
+        records = [record for path in args.records for record in read_records(path)]
+        features, outcomes = training_positions(records, args.skip_plies)
+        if len(outcomes) == 0:
+            parser.error("no quiet positions in finished games")
+        start = np.array([TunedEvaluation.DEFAULT_WEIGHTS[name] for name in TunedEvaluation.FEATURES])
+        k = fit_k(features, outcomes, start)
+        weights = tune(features, outcomes, start, k, args.iterations)
+        print(f"{len(outcomes)} positions from {len(records)} games, k = {k:.4f}")
+        print(f"error {texel_error(features, outcomes, start, k):.5f} -> {texel_error(features, outcomes, weights, k):.5f}")
+        for name, before, after in zip(TunedEvaluation.FEATURES, start, weights):
+            print(f"{name:>10} {before:8.3f} -> {after:8.3f}")
+        with open(args.weights, "w") as f:
+            json.dump({"weights": dict(zip(TunedEvaluation.FEATURES, weights.round(4).tolist())),
+                       "k": k, "positions": len(outcomes), "games": len(records)}, f, indent=2)
+            f.write("\n")
+        print(f"wrote {args.weights}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import random
+
+WHITE, BLACK, EMPTY = "W", "B", " "
+
+# the keys are drawn from a fixed seed, so a position gets the same hash in every run
+# and in every process (needed if hashes are ever written to a file)
+ZOBRIST_SEED = 20230201
+
+# zobrist_keys[(width, height)] = (white_keys, black_keys, black_turn_key),
+# white_keys[y*width + x] is the key of a white piece on (x, y)
+zobrist_keys = {}
+
+def get_zobrist_keys(width, height):
+    if (width, height) in zobrist_keys:
+        return zobrist_keys[(width, height)]
+    rng = random.Random(ZOBRIST_SEED + 1000*width + height)
+    white_keys = [rng.getrandbits(64) for sq in range(width*height)]
+    black_keys = [rng.getrandbits(64) for sq in range(width*height)]
+    black_turn_key = rng.getrandbits(64)
+    zobrist_keys[(width, height)] = white_keys, black_keys, black_turn_key
+    return zobrist_keys[(width, height)]
+
+# full hash of a board given as a list of lists, only used to initialize a state,
+# after that the hash is updated incrementally by Environment.move/undo_move
+def zobrist_hash(board, white_turn, width, height):
+    white_keys, black_keys, black_turn_key = get_zobrist_keys(width, height)
+    h = 0 if white_turn else black_turn_key
+    for y in range(height):
+        for x in range(width):
+            if board[y][x] == WHITE:
+                h ^= white_keys[y*width + x]
+            elif board[y][x] == BLACK:
+                h ^= black_keys[y*width + x]
+    return h